@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# calibrate.py - Fit the bandwidth models' traffic and contention constants from a measured build
+"""
+The per-node Mbps figures in net_band.py / net_band10G.py / ESX_nodes.py
+and the storage contention steps are estimates.  This tool measures them:
+
+    # during a real distributed build, on the coordinator (and on an ESXi / NAS host)
+    python3 calibrate.py sample --netdev coord-net.log --diskstats host-disk.log --duration 900
+
+    # afterwards: fit the constants
+    python3 calibrate.py fit --netdev coord-net.log --interface eth0 --nodes 8 \\
+        --diskstats 2=disk-2vms.log --diskstats 4=disk-4vms.log --diskstats 8=disk-8vms.log --disk sda
+
+Traffic can also come from a capture instead of counters: a classic pcap
+file (--pcap) or a packet summary CSV of time,src,dst,length
+(--flows; e.g. tshark -T fields -e frame.time_epoch -e ip.src -e ip.dst
+-e frame.len -E separator=,), split per node by --coordinator address.
+
+Every input is parsed as a stream, one line or packet at a time, keeping
+only running totals, so multi-GB captures need constant memory; .gz
+files are read transparently.  Only intervals carrying more than
+--idle-mbps count, so the fitted figures describe a busy node, as the
+models assume.
+"""
+import argparse
+import csv
+import gzip
+import io
+import ipaddress
+import json
+import socket
+import struct
+import time
+
+from capacity_model import CONTENTION_FACTORS, CONTENTION_THRESHOLDS, contention_step, storage_contention
+
+# The constants being calibrated, as currently set in the scripts
+CURRENT = {
+    'per_node_outbound': 150,  # net_band.py, Mbps coordinator -> node
+    'per_node_inbound': 350,   # net_band.py, Mbps node -> coordinator
+    'vm_nas_read': 250,        # ESX_nodes.py, Mbps per VM
+    'vm_nas_write': 180,       # ESX_nodes.py, Mbps per VM
+}
+
+SNAPSHOT_MARK = '@'  # sample files: "@ <unix time>" followed by one copy of the /proc file
+SECTOR_BYTES = 512
+
+
+class CalibrationError(Exception):
+    """Raised for input that cannot be parsed or does not contain what the fit needs"""
+
+
+class RunningStats:
+    """Count, mean and maximum of a stream of values"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        return {'samples': self.count, 'mean': round(self.mean, 3), 'max': round(self.max, 3)}
+
+
+def open_input(path, binary=False):
+    """Open a possibly gzip-compressed input with a large read buffer"""
+    raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb', buffering=1024 * 1024)
+    return raw if binary else io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+
+
+# --- counter snapshots (/proc/net/dev, /proc/diskstats) ---
+
+def read_snapshots(path, parse_line):
+    """Yield (time, {name: counters}) per snapshot of a sample file"""
+    stamp, counters = None, {}
+    with open_input(path) as f:
+        for line in f:
+            if line.startswith(SNAPSHOT_MARK):
+                if stamp is not None:
+                    yield stamp, counters
+                try:
+                    stamp, counters = float(line[1:]), {}
+                except ValueError:
+                    raise CalibrationError(f"{path}: bad snapshot mark '{line.strip()}'")
+                continue
+            parsed = parse_line(line)
+            if parsed is not None:
+                counters[parsed[0]] = parsed[1]
+    if stamp is not None:
+        yield stamp, counters
+
+
+def parse_netdev_line(line):
+    """One /proc/net/dev interface line -> (name, (rx_bytes, tx_bytes))"""
+    name, sep, data = line.partition(':')
+    fields = data.split()
+    if not sep or len(fields) < 16:
+        return None  # header lines
+    return name.strip(), (int(fields[0]), int(fields[8]))
+
+
+def parse_diskstats_line(line):
+    """One /proc/diskstats line -> (device, (read_bytes, write_bytes))"""
+    fields = line.split()
+    if len(fields) < 10:
+        return None
+    return fields[2], (int(fields[5]) * SECTOR_BYTES, int(fields[9]) * SECTOR_BYTES)
+
+
+def counter_rates(path, parse_line, name, idle_mbps):
+    """Busy-interval rates (Mbps) of one interface / device: (first counter stats, second counter stats)"""
+    first, second = RunningStats(), RunningStats()
+    previous = None
+    for stamp, counters in read_snapshots(path, parse_line):
+        if name not in counters:
+            raise CalibrationError(f"{path}: no '{name}' in the samples (found {', '.join(sorted(counters))})")
+        if previous is not None and stamp > previous[0]:
+            elapsed = stamp - previous[0]
+            rates = [(now - before) * 8 / elapsed / 1e6 for now, before in zip(counters[name], previous[1])]
+            if min(rates) >= 0 and sum(rates) > idle_mbps:  # skip idle gaps and counter resets
+                first.add(rates[0])
+                second.add(rates[1])
+        previous = stamp, counters[name]
+    if first.count == 0:
+        raise CalibrationError(f"{path}: no busy intervals for '{name}' (above {idle_mbps} Mbps)")
+    return first, second
+
+
+def sample(netdev=None, diskstats=None, interval=1.0, duration=None):
+    """Append timestamped /proc/net/dev and /proc/diskstats snapshots until duration (or Ctrl-C)"""
+    outputs = [(source, open(path, 'a')) for source, path in
+               (('/proc/net/dev', netdev), ('/proc/diskstats', diskstats)) if path]
+    if not outputs:
+        raise CalibrationError("nothing to sample: give --netdev and/or --diskstats")
+    deadline = time.monotonic() + duration if duration else None
+    taken = 0
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            stamp = time.time()
+            for source, output in outputs:
+                with open(source) as f:
+                    output.write(f"{SNAPSHOT_MARK} {stamp:.3f}\n{f.read()}")
+                output.flush()
+            taken += 1
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, output in outputs:
+            output.close()
+    print(f"📥 {taken} snapshots written")
+
+
+# --- packet captures ---
+
+class NodeTraffic:
+    """Bytes to and from one node plus the number of distinct seconds it carried traffic"""
+
+    def __init__(self):
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.active_seconds = 0
+        self._last_second = None
+
+    def add(self, timestamp, size, outbound):
+        if outbound:
+            self.bytes_out += size
+        else:
+            self.bytes_in += size
+        second = int(timestamp)
+        if second != self._last_second:
+            self.active_seconds += 1
+            self._last_second = second
+
+
+def pcap_packets(path):
+    """Yield (time, src, dst, wire length) of the IPv4 packets in a classic pcap file"""
+    with open_input(path, binary=True) as f:
+        header = f.read(24)
+        if len(header) < 24:
+            raise CalibrationError(f"{path}: not a pcap file")
+        for endian, scale in (('<', 1e-6), ('>', 1e-6), ('<', 1e-9), ('>', 1e-9)):
+            magic = 0xa1b2c3d4 if scale == 1e-6 else 0xa1b23c4d
+            if struct.unpack(endian + 'I', header[:4])[0] == magic:
+                break
+        else:
+            raise CalibrationError(f"{path}: not a classic pcap file (pcapng: convert with editcap -F pcap)")
+        linktype = struct.unpack(endian + 'I', header[20:24])[0] & 0x0FFFFFFF
+        record = struct.Struct(endian + 'IIII')
+
+        while True:
+            raw = f.read(record.size)
+            if len(raw) < record.size:
+                return
+            seconds, fraction, captured, length = record.unpack(raw)
+            data = f.read(captured)
+            if linktype == 1:  # Ethernet, with optional 802.1Q tags
+                offset, ethertype = 14, data[12:14]
+                while ethertype == b'\x81\x00' and len(data) >= offset + 4:
+                    ethertype, offset = data[offset + 2:offset + 4], offset + 4
+            elif linktype == 113:  # Linux cooked capture
+                offset, ethertype = 16, data[14:16]
+            elif linktype in (101, 228):  # raw IPv4
+                offset, ethertype = 0, b'\x08\x00'
+            else:
+                raise CalibrationError(f"{path}: unsupported link type {linktype}")
+            if ethertype != b'\x08\x00' or len(data) < offset + 20:
+                continue
+            yield (seconds + fraction * scale, socket.inet_ntoa(data[offset + 12:offset + 16]),
+                   socket.inet_ntoa(data[offset + 16:offset + 20]), length)
+
+
+def flow_packets(path):
+    """Yield (time, src, dst, length) from a packet summary CSV (header row optional)"""
+    with open_input(path) as f:
+        for row in csv.reader(f):
+            if len(row) < 4 or not row[2]:
+                continue
+            try:
+                yield float(row[0]), row[1], row[2], int(row[3])
+            except ValueError:
+                continue  # header or non-IP row
+
+
+def capture_traffic(packets, coordinator):
+    """Per-node NodeTraffic from a packet stream, relative to the coordinator's address"""
+    coordinator = str(ipaddress.ip_address(coordinator))
+    nodes = {}
+    for timestamp, src, dst, length in packets:
+        if src == coordinator:
+            node, outbound = dst, True
+        elif dst == coordinator:
+            node, outbound = src, False
+        else:
+            continue
+        traffic = nodes.get(node)
+        if traffic is None:
+            traffic = nodes[node] = NodeTraffic()
+        traffic.add(timestamp, length, outbound)
+    return nodes
+
+
+# --- fitting ---
+
+def fit_network_counters(path, interface, nodes, side='coordinator', idle_mbps=1.0):
+    """per_node_outbound / per_node_inbound from interface counters"""
+    rx, tx = counter_rates(path, parse_netdev_line, interface, idle_mbps)
+    # The coordinator sends sources (tx) and receives objects (rx); a node sees the reverse
+    outbound, inbound = (tx, rx) if side == 'coordinator' else (rx, tx)
+    share = nodes if side == 'coordinator' else 1
+    return {
+        'per_node_outbound': outbound.mean / share,
+        'per_node_inbound': inbound.mean / share,
+        'source': {'outbound_mbps': outbound.as_dict(), 'inbound_mbps': inbound.as_dict()},
+    }
+
+
+def fit_capture(nodes_traffic, min_active_seconds=5):
+    """per_node_outbound / per_node_inbound from per-node capture totals (mean over busy nodes)"""
+    busy = {node: traffic for node, traffic in nodes_traffic.items()
+            if traffic.active_seconds >= min_active_seconds}
+    if not busy:
+        raise CalibrationError("capture has no node active for long enough")
+    outbound = [t.bytes_out * 8 / t.active_seconds / 1e6 for t in busy.values()]
+    inbound = [t.bytes_in * 8 / t.active_seconds / 1e6 for t in busy.values()]
+    return {
+        'per_node_outbound': sum(outbound) / len(outbound),
+        'per_node_inbound': sum(inbound) / len(inbound),
+        'source': {node: {'outbound_mbps': round(o, 3), 'inbound_mbps': round(i, 3),
+                          'active_seconds': t.active_seconds}
+                   for (node, t), o, i in zip(busy.items(), outbound, inbound)},
+    }
+
+
+def fit_storage(runs, disk, idle_mbps=1.0, thresholds=CONTENTION_THRESHOLDS, factors=CONTENTION_FACTORS):
+    """vm_nas_read / vm_nas_write and the contention factors from diskstats runs at several VM densities
+
+    runs maps VMs per host -> diskstats sample file.  Per-VM bandwidth at
+    each density is compared with the least dense run (whose current
+    factor anchors the scale); each step's factor becomes the mean of the
+    runs falling in it, and steps without a run keep their current value.
+    """
+    per_vm = {}
+    source = {}
+    for vms, path in sorted(runs.items()):
+        read, write = counter_rates(path, parse_diskstats_line, disk, idle_mbps)
+        per_vm[vms] = (read.mean / vms, write.mean / vms)
+        source[vms] = {'read_mbps': read.as_dict(), 'write_mbps': write.as_dict()}
+
+    base_vms = min(per_vm)
+    base_total = sum(per_vm[base_vms])
+    base_factor = float(storage_contention(base_vms, thresholds, factors))
+    if base_total <= 0:
+        raise CalibrationError(f"no storage traffic at {base_vms} VMs per host")
+
+    steps = [[] for _ in factors]
+    for vms, (read, write) in per_vm.items():
+        steps[contention_step(vms, thresholds)].append((read + write) / base_total * base_factor)
+    fitted = tuple(round(sum(values) / len(values), 3) if values else factor
+                   for values, factor in zip(steps, factors))
+
+    # Uncontended per-VM demand: undo the least dense run's contention
+    read, write = per_vm[base_vms]
+    return {
+        'vm_nas_read': read / base_factor,
+        'vm_nas_write': write / base_factor,
+        'contention_factors': fitted,
+        'contention_thresholds': tuple(thresholds),
+        'source': source,
+    }
+
+
+def print_fit(fit):
+    print("📏 Calibrated model constants")
+    for name, was in CURRENT.items():
+        if name in fit:
+            print(f"  {name:18s} = {fit[name]:8.1f}   (currently {was})")
+    if 'contention_factors' in fit:
+        print(f"  contention steps     VMs/host <= {', '.join(str(t) for t in fit['contention_thresholds'])}, more")
+        print(f"  contention_factors = {fit['contention_factors']}   (currently {CONTENTION_FACTORS})")
+
+
+def parse_run(text):
+    """'VMS=FILE' -> (vms per host, path)"""
+    vms, sep, path = text.partition('=')
+    try:
+        if not sep:
+            raise ValueError
+        return int(vms), path
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected VMS_PER_HOST=FILE, got '{text}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the bandwidth models' constants from measured traffic")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sampler = commands.add_parser('sample', help="record /proc/net/dev and /proc/diskstats snapshots")
+    sampler.add_argument('--netdev', help="append network counter snapshots to this file")
+    sampler.add_argument('--diskstats', help="append disk counter snapshots to this file")
+    sampler.add_argument('--interval', type=float, default=1.0, help="seconds between snapshots")
+    sampler.add_argument('--duration', type=float, help="seconds to sample (default: until Ctrl-C)")
+
+    fitter = commands.add_parser('fit', help="fit constants from samples or captures")
+    fitter.add_argument('--netdev', help="network counter samples (from 'sample')")
+    fitter.add_argument('--interface', default='eth0', help="interface in --netdev to use")
+    fitter.add_argument('--side', choices=['coordinator', 'node'], default='coordinator',
+                        help="where --netdev was sampled")
+    fitter.add_argument('--nodes', type=int, default=1, help="compile nodes busy during a coordinator sample")
+    fitter.add_argument('--pcap', help="classic pcap capture (.gz allowed)")
+    fitter.add_argument('--flows', help="packet summary CSV: time,src,dst,length")
+    fitter.add_argument('--coordinator', help="coordinator IP address, to split a capture per node")
+    fitter.add_argument('--diskstats', action='append', type=parse_run, default=[], metavar='VMS=FILE',
+                        help="disk counter samples taken with VMS VMs per host (repeat for several densities)")
+    fitter.add_argument('--disk', default='sda', help="device in --diskstats to use")
+    fitter.add_argument('--idle-mbps', type=float, default=1.0, help="intervals at or below this are idle")
+    fitter.add_argument('--json', action='store_true', help="print the fit, with its source figures, as JSON")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'sample':
+            sample(args.netdev, args.diskstats, args.interval, args.duration)
+            return
+
+        fit = {}
+        if args.pcap or args.flows:
+            if not args.coordinator:
+                parser.error("--pcap / --flows need --coordinator")
+            packets = pcap_packets(args.pcap) if args.pcap else flow_packets(args.flows)
+            fit.update(fit_capture(capture_traffic(packets, args.coordinator)))
+        elif args.netdev:
+            fit.update(fit_network_counters(args.netdev, args.interface, args.nodes, args.side, args.idle_mbps))
+        if args.diskstats:
+            storage = fit_storage(dict(args.diskstats), args.disk, args.idle_mbps)
+            network_source = fit.pop('source', None)
+            fit.update(storage)
+            fit['source'] = {'network': network_source, 'storage': storage['source']}
+        if not fit:
+            parser.error("give --netdev, --pcap, --flows and/or --diskstats")
+    except (CalibrationError, OSError) as e:
+        parser.exit(1, f"✗ {e}\n")
+
+    if args.json:
+        print(json.dumps(fit, indent=2))
+    else:
+        print_fit(fit)
+
+
+if __name__ == '__main__':
+    main()
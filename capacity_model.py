@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# capacity_model.py - Vectorized distcc / SAN / ESXi capacity models for sweeping cluster designs
+"""
+The capacity formulas behind net_band.py, net_band10G.py and ESX_nodes.py,
+written over NumPy arrays.  Every parameter may be a scalar or an array; arrays
+broadcast against each other, so one call evaluates a whole grid of
+cluster designs at once.  grid() builds such a grid from named axes:
+
+    params = grid(nodes=range(1, 65), host_network_gbps=[10, 25], vm_per_host=[4, 6, 8, 12])
+    result = esxi_distcc(**params)          # every output is a 64 x 2 x 4 array
+    for design in best(result, params, 'effective_throughput', count=5):
+        print(design)
+
+Bandwidths are in Mbps unless the parameter name says Gbps; utilizations
+and efficiencies in the results are percentages where the scripts print
+them as such.  The scripts' scalar functions call these models with one
+design each, so there is a single copy of every formula.
+"""
+import argparse
+import time
+
+import numpy as np
+
+# Share of a link or switch the models plan to use, for stability
+PLANNED_UTILIZATION = 0.8
+
+# Storage contention: VMs per host up to each threshold keep the matching factor
+# of their storage bandwidth; beyond the last threshold the final factor applies
+CONTENTION_THRESHOLDS = (2, 4, 6, 8)
+CONTENTION_FACTORS = (1.0, 0.85, 0.70, 0.55, 0.40)
+
+MODELS = {}
+
+
+def model(name):
+    """Register a model function under a CLI name"""
+    def register(func):
+        MODELS[name] = func
+        return func
+    return register
+
+
+def grid(**axes):
+    """Named 1-D axes -> dict of arrays that broadcast to the full design grid
+
+    Axes are kept sparse (each varies along its own dimension), so building
+    the grid costs nothing; the model outputs are full-sized.
+    """
+    values = [np.asarray(list(axis) if isinstance(axis, range) else axis, dtype=float).ravel()
+              for axis in axes.values()]
+    return dict(zip(axes, np.meshgrid(*values, indexing='ij', sparse=True)))
+
+
+def best(result, params, key, count=10, where=None, lowest=False):
+    """The count designs with the highest (or lowest) result[key], as dicts of parameters + results
+
+    where is an optional boolean mask (e.g. result['storage_contention'] > 70)
+    restricting which designs qualify.
+    """
+    arrays = {**params, **result}
+    shape = np.broadcast_shapes(*(np.shape(value) for value in arrays.values()))
+    score = np.broadcast_to(np.asarray(result[key], dtype=float), shape).ravel()
+    score = score if lowest else -score
+    if where is not None:
+        score = np.where(np.broadcast_to(where, shape).ravel(), score, np.inf)
+    count = min(count, int(np.isfinite(score).sum()))
+    if count == 0:
+        return []
+    picks = np.argpartition(score, count - 1)[:count]
+    picks = picks[np.argsort(score[picks], kind='stable')]
+
+    designs = []
+    for flat in picks:
+        index = np.unravel_index(flat, shape)
+        design = {}
+        for name, value in arrays.items():
+            item = np.broadcast_to(value, shape)[index]
+            design[name] = item.item() if hasattr(item, 'item') else item
+        designs.append(design)
+    return designs
+
+
+def as_scalars(result):
+    """One design's results (0-d arrays) as plain Python numbers, bools and strings"""
+    return {name: value.item() if hasattr(value, 'item') else value for name, value in result.items()}
+
+
+def contention_step(vms_per_host, thresholds=CONTENTION_THRESHOLDS):
+    """Index into the contention factors of the step a VMs-per-host count falls in"""
+    return np.searchsorted(np.asarray(thresholds, dtype=float), vms_per_host, side='left')
+
+
+def storage_contention(vms_per_host, thresholds=CONTENTION_THRESHOLDS, factors=CONTENTION_FACTORS):
+    """Fraction of storage bandwidth left to VMs sharing a host (the calculate_storage_contention steps)"""
+    return np.asarray(factors, dtype=float)[contention_step(vms_per_host, thresholds)]
+
+
+@model('distcc')
+def distcc(nodes, switch_gbps=2.5, ethernet_gbps=2.5, per_node_outbound=150, per_node_inbound=350,
+           efficiency=0.85, utilization=PLANNED_UTILIZATION):
+    """net_band.py: distcc traffic through one switch (calculate_bandwidth_usage)"""
+    nodes = np.asarray(nodes, dtype=float)
+    requested = (per_node_outbound + per_node_inbound) * nodes * efficiency
+    node_limit = ethernet_gbps * 1000 * utilization * nodes
+    switch_limit = switch_gbps * 1000 * utilization
+    actual = np.minimum(np.minimum(requested, node_limit), switch_limit)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        network_efficiency = np.where(requested > 0, actual / requested, 0.0)
+    return {
+        'requested': requested,
+        'actual': actual,
+        'switch_limited': actual >= switch_limit * 0.95,
+        'efficiency': network_efficiency,
+    }
+
+
+@model('san')
+def distcc_san(nodes, switch_gbps=2.5, san_gbps=10.0, per_node_network_out=80, per_node_network_in=280,
+               per_node_san_read=200, per_node_san_write=150, efficiency=0.80, san_efficiency=0.75,
+               utilization=PLANNED_UTILIZATION):
+    """net_band10G.py: distcc with sources and objects on a SAN (calculate_bandwidth_usage_with_san)"""
+    nodes = np.asarray(nodes, dtype=float)
+    network_requested = (per_node_network_out + per_node_network_in) * nodes * efficiency
+    san_requested = (per_node_san_read + per_node_san_write) * nodes * san_efficiency
+
+    switch_limit = switch_gbps * 1000 * utilization
+    san_limit = san_gbps * 1000 * utilization
+    network_actual = np.minimum(network_requested, switch_limit)
+    san_actual = np.minimum(san_requested, san_limit)
+    network_utilization = network_actual / switch_limit
+    san_utilization = san_actual / san_limit
+
+    san_bound = san_utilization > network_utilization
+    peak_utilization = np.maximum(network_utilization, san_utilization)
+    with np.errstate(divide='ignore'):
+        throughput_multiplier = np.minimum(1.0, 1.0 / peak_utilization)
+    return {
+        'network_requested': network_requested,
+        'network_actual': network_actual,
+        'san_requested': san_requested,
+        'san_actual': san_actual,
+        'network_utilization': network_utilization * 100,
+        'san_utilization': san_utilization * 100,
+        'bottleneck': np.where(san_bound, 'SAN', 'Network'),
+        'bottleneck_utilization': peak_utilization * 100,
+        'effective_throughput': np.minimum(network_actual, san_actual) * throughput_multiplier,
+    }
+
+
+@model('esxi')
+def esxi_distcc(nodes, host_count=4, vm_per_host=8, nas_gbps=20.0, host_network_gbps=10.0,
+                vm_network_mbps=1000, host_storage_gbps=12.0, cpu_overhead=0.15, memory_overhead=0.10,
+                storage_overhead=0.20, network_overhead=0.08, vm_network_out=80, vm_network_in=280,
+                vm_nas_read=250, vm_nas_write=180, cpu_penalty=0.05, memory_penalty=0.03,
+                contention_thresholds=CONTENTION_THRESHOLDS, contention_factors=CONTENTION_FACTORS,
+                utilization=PLANNED_UTILIZATION):
+    """ESX_nodes.py: distcc VMs spread over an ESXi cluster (calculate_esxi_distcc_performance)"""
+    nodes = np.asarray(nodes, dtype=float)
+    host_network_mbps = host_network_gbps * 1000
+    host_storage_mbps = host_storage_gbps * 1000
+
+    # VMs fill hosts vm_per_host at a time, then spread evenly over the cluster
+    hosts_used = np.minimum(host_count, np.ceil(nodes / vm_per_host))
+    vms_per_host = np.ceil(nodes / hosts_used)
+
+    vm_storage_bw = host_storage_mbps / vms_per_host * (1 - storage_overhead)
+    vm_network_bw = np.minimum(vm_network_mbps, host_network_mbps / vms_per_host) * (1 - network_overhead)
+    contention = storage_contention(vms_per_host, contention_thresholds, contention_factors)
+
+    network_demand = (vm_network_out + vm_network_in) * nodes
+    storage_demand = (vm_nas_read + vm_nas_write) * nodes
+    available_network = hosts_used * host_network_mbps * utilization
+    available_storage = np.minimum(nas_gbps * 1000 * utilization, hosts_used * host_storage_mbps * utilization)
+    network_actual = np.minimum(network_demand, available_network)
+    storage_actual = np.minimum(storage_demand, available_storage)
+    network_utilization = network_actual / available_network
+    storage_utilization = storage_actual / available_storage
+
+    # Compilation slows by a fixed share for every VM per host beyond four
+    crowding = np.maximum(0, vms_per_host - 4)
+    cpu_contention = crowding * cpu_penalty
+    memory_contention = crowding * memory_penalty
+    resource_efficiency = 1.0 - cpu_contention - memory_contention
+
+    bottleneck_factor = np.maximum(network_utilization, storage_utilization)
+    throughput = np.minimum(network_actual, storage_actual)
+    throughput = np.where(bottleneck_factor > 1.0, throughput / bottleneck_factor, throughput)
+    return {
+        'hosts_used': hosts_used.astype(int),
+        'vms_per_host': vms_per_host,
+        'vm_cpu_allocation': 100 / vms_per_host * (1 - cpu_overhead),
+        'vm_memory_allocation': 100 / vms_per_host * (1 - memory_overhead),
+        'network_demand': network_demand,
+        'network_actual': network_actual,
+        'storage_demand': storage_demand,
+        'storage_actual': storage_actual,
+        'network_utilization': network_utilization * 100,
+        'storage_utilization': storage_utilization * 100,
+        'cpu_efficiency': (1 - cpu_contention) * 100,
+        'memory_efficiency': (1 - memory_contention) * 100,
+        'storage_contention': contention * 100,
+        'effective_throughput': throughput * resource_efficiency,
+        'bottleneck': np.where(storage_utilization > network_utilization, 'Storage', 'Network'),
+        'vm_storage_bw': np.minimum(vm_storage_bw * contention, storage_actual / nodes),
+        'vm_network_bw': np.minimum(vm_network_bw, network_actual / nodes),
+    }
+
+
+def pyplot(headless=False):
+    """matplotlib.pyplot, imported on first use; headless selects the Agg backend (file output only)"""
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def finish_figure(plt, fig, output=None):
+    """Write the figure to output (format from its extension), or show it in a window"""
+    fig.tight_layout()
+    if output:
+        fig.savefig(output, dpi=120)
+        plt.close(fig)
+        print(f"📈 Plot written to {output}")
+    else:
+        plt.show()
+
+
+def parse_axis(text):
+    """'NAME=1:32' (inclusive range), 'NAME=0.5:2:0.25' (start:stop:step) or 'NAME=4,8,12' -> (name, values)"""
+    name, sep, spec = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUES, got '{text}'")
+    try:
+        if ':' in spec:
+            parts = [float(part) for part in spec.split(':')]
+            start, stop = parts[0], parts[1]
+            step = parts[2] if len(parts) > 2 else 1.0
+            return name, np.arange(start, stop + step / 2, step)
+        return name, np.array([float(value) for value in spec.split(',')])
+    except (ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"Bad values for {name}: '{spec}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep distcc / SAN / ESXi capacity models over a grid of designs")
+    parser.add_argument('model', choices=sorted(MODELS), help="distcc (net_band.py), san (net_band10G.py) "
+                                                              "or esxi (ESX_nodes.py)")
+    parser.add_argument('axes', nargs='*', type=parse_axis, metavar='NAME=VALUES',
+                        help="model parameter to sweep, e.g. nodes=1:64 host_count=2,4,8 "
+                             "(default: nodes=1:32)")
+    parser.add_argument('--rank', default='effective_throughput',
+                        help="result to rank designs by (default: effective_throughput, "
+                             "actual for the distcc model)")
+    parser.add_argument('--lowest', action='store_true', help="rank ascending instead of descending")
+    parser.add_argument('--top', type=int, default=10, help="designs to show")
+    args = parser.parse_intermixed_args()
+
+    func = MODELS[args.model]
+    axes = dict(args.axes) or {'nodes': np.arange(1, 33)}
+    if 'nodes' not in axes:
+        parser.error("sweep at least nodes=...")
+    rank = 'actual' if args.model == 'distcc' and args.rank == 'effective_throughput' else args.rank
+
+    start = time.perf_counter()
+    params = grid(**axes)
+    try:
+        result = func(**params)
+    except TypeError as e:
+        parser.error(str(e))
+    if rank not in result:
+        parser.error(f"unknown result '{rank}' (choose from {', '.join(result)})")
+    designs = best(result, params, rank, count=args.top, lowest=args.lowest)
+    elapsed = time.perf_counter() - start
+
+    size = int(np.prod([len(values) for values in axes.values()]))
+    print(f"📐 {args.model}: {size} designs evaluated in {elapsed * 1000:.1f} ms, ranked by {rank}")
+    columns = list(axes) + [rank] + [name for name in ('bottleneck', 'network_utilization',
+                                                       'storage_utilization', 'san_utilization')
+                                     if name in result and name != rank]
+    print(" | ".join(f"{name:>12.12s}" for name in columns))
+    print("-" * (15 * len(columns)))
+    for design in designs:
+        print(" | ".join(f"{design[name]:>12.5g}" if isinstance(design[name], float)
+                         else f"{design[name]!s:>12.12s}" for name in columns))
+
+
+if __name__ == '__main__':
+    main()
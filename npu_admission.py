@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# npu_admission.py - Admission control: load shedding, per-client rate limits and priorities
+import threading
+import time
+from collections import OrderedDict
+
+# Share of the in-flight limit each priority class may fill; under overload
+# low-priority requests are turned away first and high-priority ones last
+PRIORITY_SHARES = {'high': 1.0, 'normal': 0.8, 'low': 0.5}
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Spend one token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Decide, before any work is done, whether a request is served or rejected as busy
+
+    max_inflight bounds requests admitted but not yet answered (queued for
+    or running on the NPU); None means no bound.  client_rate / client_burst give every client
+    host its own token bucket; max_clients bounds how many buckets are kept.
+    """
+
+    def __init__(self, max_inflight=32, client_rate=None, client_burst=None, max_clients=4096):
+        self.max_inflight = max_inflight
+        self.client_rate = client_rate
+        self.client_burst = client_burst or client_rate
+        self.max_clients = max_clients
+        self.inflight = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def admit(self, client, priority='normal'):
+        """None if admitted (pair with release()), else (reason, retry_after_seconds)"""
+        share = PRIORITY_SHARES.get(priority, PRIORITY_SHARES['normal'])
+        with self._lock:
+            if self.client_rate:
+                wait = self._bucket(client).take()
+                if wait:
+                    return 'rate_limited', wait
+            if self.max_inflight and self.inflight >= max(1, int(self.max_inflight * share)):
+                return 'overloaded', None
+            self.inflight += 1
+            return None
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def _bucket(self, client):
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[client] = TokenBucket(self.client_rate, self.client_burst)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# npu_batcher.py - Dynamic request batching in front of the NPU runtime
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class Cancelled(Exception):
+    """A request's deadline passed, or its client went away, before its result was needed"""
+
+    def __init__(self, reason):
+        super().__init__('deadline exceeded' if reason == 'expired' else 'client disconnected')
+        self.reason = reason
+
+
+class Deadline:
+    """How long a request stays worth running: a time budget and/or a cancel event
+
+    budget is in seconds from start (default now); cancelled is a
+    threading.Event shared by every request on a connection and set when
+    the client disconnects.
+    """
+    __slots__ = ('expires_at', 'cancelled')
+
+    def __init__(self, budget=None, cancelled=None, start=None):
+        if budget is None:
+            self.expires_at = None
+        else:
+            self.expires_at = (start if start is not None else time.monotonic()) + budget
+        self.cancelled = cancelled
+
+    @classmethod
+    def from_meta(cls, meta, cancelled=None, start=None):
+        """The deadline for a request's meta ({"deadline_ms": 50}); None if it has neither"""
+        budget_ms = meta.get('deadline_ms')
+        if budget_ms is None and cancelled is None:
+            return None
+        return cls(float(budget_ms) / 1000 if budget_ms is not None else None, cancelled, start)
+
+    def remaining(self):
+        """Seconds left, or None without a time budget"""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def reason(self):
+        """None while the request is live, else 'cancelled' or 'expired'"""
+        if self.cancelled is not None and self.cancelled.is_set():
+            return 'cancelled'
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return 'expired'
+        return None
+
+
+class InferenceJob:
+    """One input tensor waiting for an NPU result"""
+    __slots__ = ('array', 'future', 'enqueued_at', 'deadline')
+
+    def __init__(self, array, deadline=None):
+        self.array = array
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+
+
+class DynamicBatcher:
+    """Collect concurrent jobs into batches and hand each batch to run_batch
+
+    A batch is released as soon as it holds max_batch_size jobs, or when the
+    oldest job in it has waited max_wait_ms, whichever comes first.  run_batch
+    receives the list of jobs and must resolve every job's future.
+    """
+
+    def __init__(self, run_batch, max_batch_size=4, max_wait_ms=2.0, max_queue=64):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name='npu-batcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Jobs waiting to be batched"""
+        return len(self._queue)
+
+    def submit(self, array, block=True, timeout=None, deadline=None):
+        """Queue one input; returns its InferenceJob (raises queue.Full when saturated)"""
+        job = InferenceJob(array, deadline)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Batcher is stopped")
+            if len(self._queue) >= self.max_queue:
+                if not block:
+                    raise queue.Full
+                if not self._cond.wait_for(lambda: len(self._queue) < self.max_queue or self._stopped,
+                                           timeout):
+                    raise queue.Full
+                if self._stopped:
+                    raise RuntimeError("Batcher is stopped")
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job
+
+    def stop(self):
+        """Stop accepting jobs; queued jobs are still run before the thread exits"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                if self._stopped:
+                    return None
+                self._cond.wait()
+
+            # Hold the batch open until it is full or the oldest job's wait budget is spent
+            deadline = self._queue[0].enqueued_at + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            batch = [self._queue.popleft() for _ in range(size)]
+            # Wake submitters blocked on a full queue
+            self._cond.notify_all()
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
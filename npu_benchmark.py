@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# npu_benchmark.py - Load generator and latency benchmark for the NPU server protocol
+"""
+Drives rk3588NPU_server.py (or npu_coordinator.py) with closed-loop or
+open-loop load and reports throughput and latency percentiles.
+
+Closed loop: --concurrency clients each send a request, wait for the reply
+and immediately send the next one.
+
+Open loop: requests are scheduled at --rate per second (Poisson or fixed
+spacing) regardless of how fast replies come back.  Latency is measured
+from each request's scheduled start, so time spent queued behind a slow
+server is counted (no coordinated omission).  --concurrency bounds how
+many requests can be outstanding.
+
+After an error a client backs off (exponentially, up to a second), and a
+request shed by the server waits out its retry_after hint, so a dead or
+overloaded server is not hammered in a tight loop.
+
+No NPU is needed: start the server without a model to benchmark the
+serving stack on its simulated inference.
+
+    python3 rk3588NPU_server.py &
+    python3 npu_benchmark.py 127.0.0.1 --concurrency 16 --duration 20
+    python3 npu_benchmark.py 127.0.0.1 --rate 50 --protocol legacy
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from npu_protocol import NPUClient, ProtocolError, ServerBusy, legacy_infer
+
+BACKOFF_MIN = 0.01  # seconds
+BACKOFF_MAX = 1.0
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of integer values (microseconds)
+
+    Every power-of-two range is split into the same number of linear
+    sub-buckets, so any recorded value is kept to within
+    10**-significant_digits relative error while the histogram stays small
+    regardless of range.
+    """
+
+    def __init__(self, significant_digits=3):
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_half = 1 << (self.sub_bucket_bits - 1)
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value):
+        bucket = max(0, value.bit_length() - self.sub_bucket_bits)
+        return bucket * self.sub_bucket_half + (value >> bucket)
+
+    def _highest_equivalent(self, index):
+        bucket = max(0, index // self.sub_bucket_half - 1)
+        sub_bucket = index - bucket * self.sub_bucket_half
+        return ((sub_bucket + 1) << bucket) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * percent / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0
+
+    def distribution(self, ticks_per_half=5):
+        """(value, percentile, count) rows like HdrHistogram's percentile distribution"""
+        rows = []
+        percent = 0.0
+        while percent < 100.0:
+            rows.append((self.percentile(percent), percent))
+            # Halve the remaining distance to 100% in ticks_per_half steps
+            remaining = 100.0 - percent
+            percent += remaining / 2 / ticks_per_half if remaining > 0.001 else remaining
+        rows.append((self.max, 100.0))
+        return rows
+
+
+class Results:
+    """Per-thread counters and histogram, merged after the run"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self.busy = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+
+class Benchmark:
+    def __init__(self, host, port, payload, protocol='framed', model=None, timeout=30.0,
+                 compression=None, output_dtype=None):
+        self.host = host
+        self.port = port
+        self.payload = payload
+        self.protocol = protocol
+        self.meta = {'model': model} if model else None
+        self.timeout = timeout
+        self.compression = compression
+        self.output_dtype = output_dtype
+
+    def _connect(self):
+        if self.protocol == 'framed':
+            return NPUClient(self.host, self.port, timeout=self.timeout,
+                             compression=self.compression, output_dtype=self.output_dtype)
+        return None
+
+    def _request(self, client):
+        """One request; returns (client, result bytes) - client is replaced after errors"""
+        if self.protocol == 'framed':
+            if client is None:
+                client = self._connect()
+                try:
+                    return client, client.infer(self.payload, self.meta)
+                except BaseException:
+                    # The caller never received this client, so it cannot close it
+                    client.close()
+                    raise
+            return client, client.infer(self.payload, self.meta)
+        return None, legacy_infer(self.host, self.port, self.payload, timeout=self.timeout)
+
+    def _worker(self, results, next_start, stop_at, record_after):
+        client = None
+        backoff = 0.0
+
+        def pause(seconds):
+            time.sleep(max(0.0, min(seconds, stop_at - time.monotonic())))
+
+        while True:
+            intended = next_start()
+            if intended is None or intended >= stop_at:
+                break
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                client, result = self._request(client)
+                ok = bool(result)
+            except ServerBusy as e:
+                # Shed by admission control; the connection is still good.  Wait as
+                # long as the server asks, or back off as for an error
+                if intended >= record_after:
+                    results.busy += 1
+                backoff = min(BACKOFF_MAX, max(BACKOFF_MIN, backoff * 2))
+                pause(e.retry_after if e.retry_after is not None else backoff)
+                continue
+            except (OSError, ProtocolError):
+                ok = False
+                result = b''
+                if client is not None:
+                    client.close()
+                    client = None
+            done = time.monotonic()
+            if ok:
+                backoff = 0.0
+            else:
+                backoff = min(BACKOFF_MAX, max(BACKOFF_MIN, backoff * 2))
+                pause(backoff)
+
+            if intended < record_after:
+                continue
+            if not ok:
+                results.errors += 1
+                continue
+            results.histogram.record((done - intended) * 1_000_000)
+            results.bytes_out += len(self.payload)
+            results.bytes_in += len(result)
+
+        if client is not None:
+            client.close()
+
+    def run(self, concurrency=8, duration=10.0, warmup=2.0, rate=None, arrival='poisson'):
+        """Run closed-loop (rate=None) or open-loop load; returns (merged Results, elapsed)"""
+        start = time.monotonic() + 0.1
+        record_after = start + warmup
+        stop_at = record_after + duration
+        lock = threading.Lock()
+
+        if rate:
+            # Open loop: one shared schedule of intended start times
+            schedule = {'next': start}
+
+            def next_start():
+                with lock:
+                    intended = schedule['next']
+                    gap = random.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+                    schedule['next'] = intended + gap
+                    return intended
+        else:
+            # Closed loop: each worker starts its next request as soon as the last one ends
+            def next_start():
+                return max(time.monotonic(), start)
+
+        per_thread = [Results() for _ in range(concurrency)]
+        threads = [threading.Thread(target=self._worker, daemon=True,
+                                    args=(results, next_start, stop_at, record_after))
+                   for results in per_thread]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        merged = Results()
+        for results in per_thread:
+            merged.histogram.merge(results.histogram)
+            merged.errors += results.errors
+            merged.busy += results.busy
+            merged.bytes_out += results.bytes_out
+            merged.bytes_in += results.bytes_in
+        return merged, stop_at - record_after
+
+
+def report(results, elapsed, show_distribution=False):
+    hist = results.histogram
+    throughput = hist.total / elapsed if elapsed else 0
+    summary = {
+        'requests': hist.total,
+        'errors': results.errors,
+        'busy': results.busy,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(throughput, 2),
+        'mbps_out': round(results.bytes_out * 8 / elapsed / 1e6, 2) if elapsed else 0,
+        'mbps_in': round(results.bytes_in * 8 / elapsed / 1e6, 2) if elapsed else 0,
+        'latency_ms': {
+            'min': (hist.min or 0) / 1000,
+            'mean': round(hist.mean() / 1000, 3),
+            'p50': hist.percentile(50) / 1000,
+            'p95': hist.percentile(95) / 1000,
+            'p99': hist.percentile(99) / 1000,
+            'p99.9': hist.percentile(99.9) / 1000,
+            'max': hist.max / 1000,
+        },
+    }
+
+    print(f"Requests:   {hist.total} ok, {results.errors} errors, {results.busy} busy in {elapsed:.1f} s")
+    print(f"Throughput: {throughput:.1f} req/s "
+          f"({summary['mbps_out']:.1f} Mbps out, {summary['mbps_in']:.1f} Mbps in)")
+    print("Latency (ms):")
+    for name, value in summary['latency_ms'].items():
+        print(f"  {name:>6s}  {value:10.3f}")
+
+    if show_distribution and hist.total:
+        print("\n       Value(ms)   Percentile")
+        for value, percent in hist.distribution():
+            print(f"  {value / 1000:14.3f}   {percent:10.5f}%")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark an RK3588 NPU server (or coordinator)")
+    parser.add_argument('host')
+    parser.add_argument('port', nargs='?', type=int, default=8080)
+    parser.add_argument('--protocol', choices=('framed', 'legacy'), default='framed',
+                        help="framed: persistent connections; legacy: one connection per request")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="closed loop: concurrent clients; open loop: max requests outstanding")
+    parser.add_argument('--rate', type=float, help="open-loop request rate (req/s); omit for closed loop")
+    parser.add_argument('--arrival', choices=('poisson', 'fixed'), default='poisson',
+                        help="open-loop inter-arrival distribution")
+    parser.add_argument('--size', type=int, default=224 * 224 * 3, help="request payload bytes")
+    parser.add_argument('--image', help="send this JPEG/PNG file instead of random bytes "
+                                        "(the server decodes and resizes it)")
+    parser.add_argument('--model', help="model name to request (framed protocol only)")
+    parser.add_argument('--compression', help="framed: compress payloads (lz4, zstd, zlib or auto)")
+    parser.add_argument('--output-dtype', choices=('float32', 'float16', 'int8'),
+                        help="framed: ask for outputs in this encoding")
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=2.0, help="unrecorded seconds before measuring")
+    parser.add_argument('--distribution', action='store_true', help="print the percentile distribution")
+    parser.add_argument('--json', help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            payload = f.read()
+    else:
+        payload = os.urandom(args.size)
+
+    mode = f"open loop {args.rate:g} req/s ({args.arrival})" if args.rate else "closed loop"
+    print(f"🏁 {args.host}:{args.port} {args.protocol}, {mode}, concurrency {args.concurrency}, "
+          f"{len(payload)} byte requests, {args.duration:g} s (+{args.warmup:g} s warm-up)")
+
+    benchmark = Benchmark(args.host, args.port, payload,
+                          protocol=args.protocol, model=args.model,
+                          compression=args.compression, output_dtype=args.output_dtype)
+    results, elapsed = benchmark.run(concurrency=args.concurrency, duration=args.duration,
+                                     warmup=args.warmup, rate=args.rate, arrival=args.arrival)
+    summary = report(results, elapsed, show_distribution=args.distribution)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
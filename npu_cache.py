@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# npu_cache.py - Content-addressed cache of inference results
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(model_name, data):
+    """128-bit BLAKE2b digest of the model name and the raw request bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(model_name).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(data)
+    return digest.digest()
+
+
+class ResultCache:
+    """Size-bounded LRU of output arrays with an optional time-to-live
+
+    Entries are charged the nbytes of their arrays against max_bytes and
+    evicted least-recently-used first.  Cached arrays are shared between
+    requests, so they are made read-only.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, outputs, nbytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached outputs for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove_locked(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, outputs):
+        nbytes = sum(output.nbytes for output in outputs)
+        if nbytes > self.max_bytes:
+            return
+        for output in outputs:
+            output.flags.writeable = False
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (expires_at, outputs, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove_locked(self, key):
+        _, _, nbytes = self._entries.pop(key)
+        self.bytes -= nbytes
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# npu_codec.py - Payload compression and compact output encodings for the framed protocol
+"""
+Negotiated per connection with a MSG_HELLO exchange, then applied per
+request through the frame metadata:
+
+    request meta    {"compression": "lz4"}            payload is compressed
+                    {"accept_compression": "lz4"}     compress the response
+                    {"output_dtype": "float16"}       or "int8" / "float32"
+    response meta   {"compression": "lz4", "dtype": "int8",
+                     "sizes": [1000, 84], "scales": [0.0123, 0.5]}
+
+float16 halves the result bytes; int8 quarters them using one symmetric
+scale per output (value = int8 * scale).  zlib is always available, lz4
+and zstd when their Python packages are installed.
+"""
+import zlib
+
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+OUTPUT_DTYPES = ('float32', 'float16', 'int8')
+
+
+class CodecError(Exception):
+    """Raised for an unknown codec or a payload that does not decode"""
+
+
+def _zlib_decompress(data, limit):
+    decompressor = zlib.decompressobj()
+    result = decompressor.decompress(data, limit + 1)
+    if len(result) > limit or decompressor.unconsumed_tail:
+        raise CodecError(f"Decompressed payload exceeds {limit} bytes")
+    return result
+
+
+def _lz4_decompress(data, limit):
+    decompressor = lz4.frame.LZ4FrameDecompressor()
+    result = decompressor.decompress(data, max_length=limit + 1)
+    if len(result) > limit:
+        raise CodecError(f"Decompressed payload exceeds {limit} bytes")
+    if not decompressor.eof:
+        raise CodecError("Truncated lz4 payload")
+    return result
+
+
+def _zstd_decompress(data, limit):
+    # decompress(max_output_size=) is ignored when the frame header declares its size,
+    # so refuse an oversized declaration and stream the rest, stopping past the limit
+    chunks, size = [], 0
+    try:
+        declared = zstandard.frame_content_size(data)
+        if declared > limit:
+            raise CodecError(f"Decompressed payload exceeds {limit} bytes")
+        with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+            while size <= limit:
+                chunk = reader.read(min(limit + 1 - size, 1024 * 1024))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+        if size > limit:
+            raise CodecError(f"Decompressed payload exceeds {limit} bytes")
+        # The reader stops quietly at the end of a truncated frame; what is there fits the limit
+        if declared >= 0:
+            complete = size == declared
+        else:
+            checker = zstandard.ZstdDecompressor().decompressobj()
+            checker.decompress(data)
+            complete = checker.eof
+        if not complete:
+            raise CodecError("Truncated zstd payload")
+    except zstandard.ZstdError as e:
+        raise CodecError(str(e))
+    return b''.join(chunks)
+
+
+# name -> (compress(data), decompress(data, limit)); fastest settings, the link is the bottleneck
+COMPRESSORS = {'zlib': (lambda data: zlib.compress(data, 1), _zlib_decompress)}
+if lz4 is not None:
+    COMPRESSORS['lz4'] = (lz4.frame.compress, _lz4_decompress)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (lambda data: zstandard.ZstdCompressor(level=1).compress(data),
+                           _zstd_decompress)
+
+
+def available_compressions():
+    """Compressions this process can speak, fastest first"""
+    return [name for name in ('lz4', 'zstd', 'zlib') if name in COMPRESSORS]
+
+
+def choose(offered, supported):
+    """The first of the peer's preferences we also support, or None"""
+    for name in offered or ():
+        if name in supported:
+            return name
+    return None
+
+
+def compress(name, data):
+    if name not in COMPRESSORS:
+        raise CodecError(f"Unsupported compression '{name}'")
+    if isinstance(data, (list, tuple)):
+        data = b''.join(bytes(memoryview(buffer).cast('B')) for buffer in data)
+    return COMPRESSORS[name][0](data)
+
+
+def decompress(name, data, limit):
+    if name not in COMPRESSORS:
+        raise CodecError(f"Unsupported compression '{name}'")
+    try:
+        return COMPRESSORS[name][1](data, limit)
+    except (zlib.error, RuntimeError) as e:
+        raise CodecError(f"Corrupt {name} payload: {e}")
+
+
+def encode_outputs(outputs, dtype='float32'):
+    """float32 output arrays -> (buffers to send, response meta describing them)"""
+    if dtype not in OUTPUT_DTYPES:
+        raise CodecError(f"Unsupported output dtype '{dtype}'")
+    meta = {'dtype': dtype, 'sizes': [int(output.size) for output in outputs]}
+    if dtype == 'float32':
+        return list(outputs), meta
+    if dtype == 'float16':
+        return [output.astype(np.float16) for output in outputs], meta
+
+    encoded = []
+    scales = []
+    for output in outputs:
+        peak = float(np.max(np.abs(output))) if output.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.rint(output / scale)
+        encoded.append(np.clip(quantized, -127, 127).astype(np.int8))
+        scales.append(scale)
+    meta['scales'] = scales
+    return encoded, meta
+
+
+def decode_outputs(payload, meta):
+    """Response payload + meta -> list of float32 arrays (one per output)"""
+    meta = meta or {}
+    dtype = meta.get('dtype', 'float32')
+    if dtype not in OUTPUT_DTYPES:
+        raise CodecError(f"Unsupported output dtype '{dtype}'")
+    values = np.frombuffer(payload, dtype=dtype)
+    sizes = meta.get('sizes') or [values.size]
+    scales = meta.get('scales') or [None] * len(sizes)
+
+    outputs = []
+    offset = 0
+    for size, scale in zip(sizes, scales):
+        chunk = values[offset:offset + size]
+        offset += size
+        if scale is not None:
+            outputs.append(chunk.astype(np.float32) * np.float32(scale))
+        else:
+            outputs.append(chunk.astype(np.float32, copy=False))
+    return outputs
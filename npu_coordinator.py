@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# npu_coordinator.py - Load balancer in front of many RK3588 NPU servers
+"""
+Clients talk to the coordinator exactly as they would to a single
+rk3588NPU_server.py (legacy or framed protocol).  Each request is forwarded
+over a pooled persistent framed connection to one backend node, chosen by
+least outstanding requests or by latency-weighted load, and retried on
+another node if the chosen one fails.  A request's deadline_ms is passed on
+as the budget still left when it is sent to a node.  Pipelined framed
+requests are forwarded concurrently and answered as they complete.
+"""
+import argparse
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from npu_batcher import Deadline
+from npu_codec import OUTPUT_DTYPES, choose
+from npu_logging import fields, get_logger, setup_logging, shutdown_logging
+from npu_protocol import (
+    MAGIC, MAX_PAYLOAD_SIZE, MSG_HELLO, MSG_REQUEST, MSG_RESPONSE, SIZE_HEADER, STATUS_BUSY, STATUS_ERROR,
+    STATUS_EXPIRED, STATUS_OK,
+    BufferPool, Frame, NPUClient, ProtocolError, read_frame, recv_exact, recv_into_exact,
+    send_buffers, server_handshake, write_frame,
+)
+
+POLICIES = ('least-outstanding', 'latency')
+
+log = get_logger('coordinator')
+request_log = get_logger('request')
+
+
+class NoBackendAvailable(Exception):
+    """Raised when every backend node is down or the retries are used up"""
+
+
+class BackendNode:
+    """One NPU server: a pool of persistent connections plus load and health state"""
+
+    def __init__(self, host, port, max_connections=4, connect_timeout=2.0, read_timeout=30.0):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.outstanding = 0
+        self.latency_ewma = None  # seconds
+        self.completed = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self._backoff = 0.0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def checkout(self):
+        """Take an idle pooled connection, or open a new one"""
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            client = NPUClient(self.host, self.port, timeout=self.connect_timeout)
+            # Inference can take far longer than connecting
+            client.sock.settimeout(self.read_timeout)
+            return client
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, client, broken=False):
+        if broken:
+            client.close()
+        else:
+            with self._lock:
+                self._idle.append(client)
+        self._slots.release()
+
+    def record_success(self, latency, alpha=0.2):
+        with self._lock:
+            self.completed += 1
+            self._backoff = 0.0
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma += alpha * (latency - self.latency_ewma)
+
+    def record_failure(self):
+        """Take the node out of rotation with exponential backoff and drop its idle connections"""
+        with self._lock:
+            self.failures += 1
+            self._backoff = min(30.0, max(1.0, self._backoff * 2))
+            self.down_until = time.monotonic() + self._backoff
+            idle, self._idle = self._idle, []
+        for client in idle:
+            client.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for client in idle:
+            client.close()
+
+
+class NPUCoordinator:
+    def __init__(self, backends, policy='least-outstanding', connections_per_node=4, retries=2,
+                 read_timeout=30.0, pipeline_depth=16, forward_workers=64):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}' (choose from {', '.join(POLICIES)})")
+        self.nodes = [BackendNode(host, port, connections_per_node, read_timeout=read_timeout)
+                      for host, port in backends]
+        self.policy = policy
+        self.retries = retries
+        self.pipeline_depth = pipeline_depth
+        self.buffers = BufferPool()
+        self.workers = ThreadPoolExecutor(max_workers=forward_workers, thread_name_prefix='npu-forward')
+        self._lock = threading.Lock()
+
+    def pick_node(self, exclude=()):
+        """Choose a backend for the next request according to the policy"""
+        with self._lock:
+            candidates = [node for node in self.nodes if node.healthy and node not in exclude]
+            if not candidates:
+                # Everything is backing off - try the node that comes back soonest
+                candidates = sorted((node for node in self.nodes if node not in exclude),
+                                    key=lambda node: node.down_until)[:1]
+            if not candidates:
+                raise NoBackendAvailable("No backend nodes available")
+
+            if self.policy == 'latency':
+                # Expected wait: queue ahead of us times the node's typical service time;
+                # nodes without a measurement yet are tried first
+                def cost(node):
+                    if node.latency_ewma is None:
+                        return 0.0
+                    return (node.outstanding + 1) * node.latency_ewma
+            else:
+                def cost(node):
+                    return node.outstanding
+
+            best = min(cost(node) for node in candidates)
+            node = random.choice([node for node in candidates if cost(node) == best])
+            node.outstanding += 1
+            return node
+
+    def forward(self, payload, meta=None, deadline=None):
+        """Send one request to a backend, failing over to others; returns the response Frame"""
+        tried = []
+        busy = None
+        for _ in range(self.retries + 1):
+            if deadline is not None:
+                # Hand the node only what is left of the client's budget
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    return Frame(MSG_RESPONSE, STATUS_EXPIRED, 0, {'error': 'deadline exceeded'}, b'')
+                meta = dict(meta, deadline_ms=round(remaining * 1000, 3))
+            try:
+                node = self.pick_node(exclude=tried)
+            except NoBackendAvailable:
+                break
+            tried.append(node)
+
+            client = None
+            try:
+                start_time = time.monotonic()
+                client = node.checkout()
+                frame = client.request(payload, meta)
+                node.checkin(client)
+                if frame.status == STATUS_BUSY:
+                    # The node is healthy but shedding load: try another one
+                    log.info("Node busy, trying another", extra=fields(node=node))
+                    busy = frame
+                    continue
+                node.record_success(time.monotonic() - start_time)
+                return frame
+            except (OSError, ProtocolError) as e:
+                log.warning(f"✗ Node failed: {e}", extra=fields(node=node))
+                if client is not None:
+                    node.checkin(client, broken=True)
+                node.record_failure()
+            finally:
+                with self._lock:
+                    node.outstanding -= 1
+
+        if busy is not None:
+            return busy
+        raise NoBackendAvailable(f"Request failed on {len(tried)} node(s)")
+
+    def handle_client(self, client_socket, client_address):
+        """Handle client connection (same wire protocol as the NPU server)"""
+        try:
+            size_data = recv_exact(client_socket, 4)
+            if size_data is None:
+                return
+
+            if size_data == MAGIC:
+                self.serve_framed(client_socket, client_address)
+                return
+
+            data_size = int.from_bytes(size_data, byteorder='little')
+            if data_size > MAX_PAYLOAD_SIZE:
+                request_log.warning("✗ Refusing oversized request",
+                                    extra=fields(client=client_address, bytes=data_size))
+                return
+
+            buffer = self.buffers.acquire(data_size)
+            try:
+                input_data = memoryview(buffer)[:data_size]
+                if not recv_into_exact(client_socket, input_data):
+                    return
+                try:
+                    frame = self.forward(input_data)
+                    results = frame.payload if frame.status == STATUS_OK else b''
+                except NoBackendAvailable as e:
+                    request_log.warning(f"✗ {e}", extra=fields(client=client_address))
+                    results = b''
+            finally:
+                self.buffers.release(buffer)
+
+            # Legacy clients see an empty result for any failure, as with a single server
+            send_buffers(client_socket, [SIZE_HEADER.pack(len(results)), results])
+
+        except Exception as e:
+            request_log.warning(f"✗ Error with client: {e}", extra=fields(client=client_address))
+        finally:
+            client_socket.close()
+
+    def serve_framed(self, client_socket, client_address):
+        """Forward every request on a persistent framed connection"""
+        try:
+            server_handshake(client_socket)
+        except ProtocolError as e:
+            request_log.warning(f"✗ Handshake failed: {e}", extra=fields(client=client_address))
+            return
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # Each request is forwarded on a worker, so a pipelining client spreads across the
+        # nodes, and answered as soon as its node replies - the request_id tells the client
+        # which request it is.  At most pipeline_depth requests are in flight per connection.
+        window = threading.BoundedSemaphore(self.pipeline_depth)
+        write_lock = threading.Lock()
+
+        def reply(msg_type, request_id, payload=b'', status=STATUS_OK, meta=None):
+            try:
+                with write_lock:
+                    write_frame(client_socket, msg_type, request_id, payload, status=status, meta=meta)
+            except OSError as e:
+                # Unblock the reader; requests still in flight fail the same way
+                request_log.warning(f"✗ Send failed: {e}", extra=fields(client=client_address))
+                try:
+                    client_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        def forward(frame, deadline):
+            try:
+                response = self.forward(frame.payload, frame.meta, deadline)
+                reply(MSG_RESPONSE, frame.request_id, response.payload, response.status, response.meta)
+            except NoBackendAvailable as e:
+                reply(MSG_RESPONSE, frame.request_id, status=STATUS_ERROR, meta={'error': str(e)})
+            except Exception as e:
+                request_log.warning(f"✗ Forward failed: {e}", extra=fields(client=client_address))
+                reply(MSG_RESPONSE, frame.request_id, status=STATUS_ERROR, meta={'error': str(e)})
+            finally:
+                if frame.buffer is not None:
+                    self.buffers.release(frame.buffer)
+                window.release()
+
+        try:
+            while True:
+                try:
+                    frame = read_frame(client_socket, self.buffers)
+                except (OSError, ProtocolError) as e:
+                    request_log.warning(f"✗ Protocol error: {e}", extra=fields(client=client_address))
+                    break
+                if frame is None:
+                    break
+
+                if frame.msg_type == MSG_REQUEST:
+                    deadline = Deadline.from_meta(frame.meta, start=time.monotonic() - frame.recv_seconds)
+                    window.acquire()
+                    self.workers.submit(forward, frame, deadline)
+                    continue
+                if frame.msg_type == MSG_HELLO:
+                    # Requests are forwarded as-is and decoded by the backend, so only offer
+                    # what every node is sure to have (zlib ships with Python)
+                    dtypes = frame.meta.get('output_dtypes') or []
+                    reply(MSG_HELLO, frame.request_id, meta={
+                        'compression': choose(frame.meta.get('compression'), ['zlib']),
+                        'output_dtype': choose(dtypes, OUTPUT_DTYPES),
+                        'compressions': ['zlib'], 'output_dtypes': list(OUTPUT_DTYPES)})
+                else:
+                    reply(MSG_RESPONSE, frame.request_id, status=STATUS_ERROR,
+                          meta={'error': f"unexpected message type {frame.msg_type}"})
+                if frame.buffer is not None:
+                    self.buffers.release(frame.buffer)
+        finally:
+            # Answer everything already received before the connection is closed
+            for _ in range(self.pipeline_depth):
+                window.acquire()
+
+    def status(self):
+        """One line per node: load, latency and health"""
+        lines = []
+        for node in self.nodes:
+            latency = f"{node.latency_ewma * 1000:.1f} ms" if node.latency_ewma is not None else "-"
+            state = "up" if node.healthy else "DOWN"
+            lines.append(f"  {str(node):21s} {state:4s} outstanding={node.outstanding:3d} "
+                         f"latency={latency:>9s} completed={node.completed} failures={node.failures}")
+        return "\n".join(lines)
+
+    def start(self, host='0.0.0.0', port=8000, backlog=128, status_interval=30.0):
+        """Accept clients and balance their requests across the backends"""
+        print(f"🚀 Starting NPU coordinator on {host}:{port}")
+        print(f"⚖️  Policy: {self.policy}, {len(self.nodes)} backend node(s)")
+
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        def report():
+            while True:
+                time.sleep(status_interval)
+                print(f"📊 Backend status:\n{self.status()}")
+
+        if status_interval:
+            threading.Thread(target=report, daemon=True).start()
+
+        try:
+            server_socket.bind((host, port))
+            server_socket.listen(backlog)
+            print(f"✅ Coordinator listening on {host}:{port}")
+
+            while True:
+                try:
+                    client_socket, client_address = server_socket.accept()
+                    threading.Thread(target=self.handle_client,
+                                     args=(client_socket, client_address), daemon=True).start()
+                except KeyboardInterrupt:
+                    print("\n🛑 Shutting down coordinator...")
+                    break
+                except Exception as e:
+                    log.warning(f"Accept error: {e}")
+        finally:
+            server_socket.close()
+            self.workers.shutdown(wait=False, cancel_futures=True)
+            for node in self.nodes:
+                node.close()
+            print("✅ Coordinator stopped")
+
+
+def parse_backend(spec, default_port=8080):
+    host, _, port = spec.rpartition(':')
+    if not host:
+        return spec, default_port
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balance NPU inference requests across RK3588 servers")
+    parser.add_argument('backends', nargs='+', metavar='HOST[:PORT]', help="NPU server nodes")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--policy', choices=POLICIES, default='least-outstanding')
+    parser.add_argument('--connections-per-node', type=int, default=4,
+                        help="pooled persistent connections (= concurrent requests) per node")
+    parser.add_argument('--retries', type=int, default=2, help="other nodes to try when one fails")
+    parser.add_argument('--read-timeout', type=float, default=30.0,
+                        help="seconds to wait for a node's reply before counting it as failed")
+    parser.add_argument('--pipeline-depth', type=int, default=16,
+                        help="requests one framed client may have in flight across the nodes")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'))
+    parser.add_argument('--log-file', help="write the log here instead of stdout")
+    parser.add_argument('--status-interval', type=float, default=30.0,
+                        help="seconds between backend status reports (0 to disable)")
+    args = parser.parse_args()
+    setup_logging(args.log_level, path=args.log_file)
+
+    coordinator = NPUCoordinator([parse_backend(spec) for spec in args.backends],
+                                 policy=args.policy,
+                                 connections_per_node=args.connections_per_node,
+                                 retries=args.retries,
+                                 read_timeout=args.read_timeout,
+                                 pipeline_depth=args.pipeline_depth)
+    try:
+        coordinator.start(host=args.host, port=args.port, status_interval=args.status_interval)
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    main()
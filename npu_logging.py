@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# npu_logging.py - Structured, sampled logging written from a background thread
+"""
+Request threads never format or write log lines themselves: a log call
+puts the record on a bounded in-memory queue and returns.  A QueueListener
+thread formats the records and writes them to stdout (or a file), so a slow
+terminal or journald never holds up the serving path.  If the writer falls
+behind, records are dropped instead of stalling requests; they are counted
+in npu_log_records_dropped_total and reported when logging shuts down.
+
+Hot-path messages go to the 'npu.request' logger and can be sampled (one
+in every N below WARNING); warnings and errors are always kept.
+
+    from npu_logging import get_logger, fields
+    log = get_logger('request')
+    log.info("📤 Response sent", extra=fields(bytes=4000, client="10.0.0.5:40122"))
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from npu_metrics import Counter
+
+ROOT = 'npu'
+REQUEST = 'npu.request'
+
+DROPPED = Counter('npu_log_records_dropped_total', "Log records dropped because the writer fell behind")
+
+
+def get_logger(name=None):
+    """The 'npu' logger, or 'npu.<name>' below it"""
+    return logging.getLogger(f"{ROOT}.{name}" if name else ROOT)
+
+
+def fields(**values):
+    """extra= payload for structured key=value fields on one record"""
+    return {'fields': values}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """'time level logger: message key=value ...' lines"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        values = getattr(record, 'fields', None)
+        if values:
+            line += ' ' + ' '.join(f"{key}={self._quote(value)}" for key, value in values.items())
+        return line
+
+    @staticmethod
+    def _quote(value):
+        # Socket addresses read better as host:port
+        text = ':'.join(map(str, value)) if isinstance(value, tuple) else str(value)
+        return f'"{text}"' if not text or ' ' in text or '=' in text else text
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every `every` hot-path records below WARNING"""
+
+    def __init__(self, every=1, prefix=REQUEST):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.prefix = prefix
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every == 1 or record.levelno >= logging.WARNING:
+            return True
+        if not record.name.startswith(self.prefix):
+            return True
+        with self._lock:
+            self._seen += 1
+            return self._seen % self.every == 1
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Line formatting happens on the listener thread; only resolve what may
+        # not outlive the caller (lazy %-args and the exception traceback)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging(level='INFO', sample_every=1, path=None, queue_size=10000):
+    """Route 'npu' logging through a background writer; returns the queue handler
+
+    Safe to call again (e.g. from a CLI after library defaults): the
+    previous writer is flushed and replaced.
+    """
+    global _listener, _handler
+    shutdown_logging()
+
+    target = logging.FileHandler(path) if path else logging.StreamHandler(sys.stdout)
+    target.setFormatter(KeyValueFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(SamplingFilter(sample_every))
+
+    logger = get_logger()
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        if _handler.dropped:
+            # Written straight to the target: the queue is no longer drained
+            record = get_logger().makeRecord(ROOT, logging.WARNING, __file__, 0,
+                                             f"⚠️  {_handler.dropped} log records dropped", None, None)
+            for handler in _listener.handlers:
+                handler.handle(record)
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        _handler = None
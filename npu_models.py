@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# npu_models.py - Registry of named RKNN models, loaded lazily and evicted LRU
+import glob
+import os
+import threading
+from collections import OrderedDict
+
+from npu_logging import get_logger
+
+log = get_logger('models')
+
+
+class LoadedModel:
+    """The runtimes serving one model: its NPU worker pool and optional batcher"""
+
+    def __init__(self, name, path, pool, batcher=None, size_bytes=0):
+        self.name = name
+        self.path = path
+        self.pool = pool
+        self.batcher = batcher
+        self.size_bytes = size_bytes
+        self.in_use = 0  # requests currently holding the model (never evicted while > 0)
+
+    @property
+    def simulated(self):
+        return all(worker.runtime is None for worker in self.pool.workers)
+
+    def submit(self, array, deadline=None):
+        """Queue one input on this model; returns its InferenceJob"""
+        if self.batcher is not None:
+            return self.batcher.submit(array, deadline=deadline)
+        return self.pool.submit(array, deadline=deadline)
+
+    def close(self):
+        """Finish queued work and release every runtime"""
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.pool.close()
+
+
+class ModelRegistry:
+    """Map model names to RKNN files and keep the recently used ones loaded
+
+    loader(name, path) builds a LoadedModel; it runs outside the registry
+    lock so a slow load does not stall requests for models already warm.
+    Models are charged size_bytes against memory_budget_bytes, and idle
+    models are evicted least-recently-used first to make room.  copies is
+    how many runtimes each model gets (one per NPU core), for estimating
+    what a model will cost before it is loaded.
+    """
+
+    def __init__(self, loader, memory_budget_bytes=1024 * 1024 * 1024, copies=1):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.copies = copies
+        self.paths = {}
+        self._loaded = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def register(self, name, path):
+        self.paths[name] = path
+
+    def register_directory(self, directory):
+        """Register every *.rknn file in a directory under its base name"""
+        for path in sorted(glob.glob(os.path.join(directory, '*.rknn'))):
+            self.register(os.path.splitext(os.path.basename(path))[0], path)
+
+    @property
+    def loaded(self):
+        """Names of the models currently loaded, least recently used first"""
+        with self._lock:
+            return list(self._loaded)
+
+    def acquire(self, name):
+        """Get a loaded model (loading it on first use); pair with release()"""
+        while True:
+            with self._lock:
+                model = self._loaded.get(name)
+                if model is not None:
+                    self._loaded.move_to_end(name)
+                    model.in_use += 1
+                    return model
+                if name not in self.paths:
+                    raise KeyError(f"Unknown model '{name}'")
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = threading.Event()
+                    # Make room before the new runtimes allocate NPU memory
+                    evicted = self._evict_locked(self._estimate(self.paths[name]))
+                else:
+                    evicted = None
+
+            if evicted is None:
+                # Another request is loading this model - wait for it and look again
+                loading.wait()
+                continue
+
+            for old in evicted:
+                log.info(f"♻️  Evicting model '{old.name}' (LRU)")
+                old.close()
+
+            try:
+                model = self.loader(name, self.paths[name])
+                with self._lock:
+                    self._loaded[name] = model
+                    model.in_use += 1
+            finally:
+                with self._lock:
+                    del self._loading[name]
+                loading.set()
+            return model
+
+    def release(self, model):
+        with self._lock:
+            model.in_use -= 1
+            evicted = self._evict_locked()
+        for old in evicted:
+            log.info(f"♻️  Evicting model '{old.name}' (LRU)")
+            old.close()
+
+    def close(self):
+        """Release every loaded model"""
+        with self._lock:
+            models = list(self._loaded.values())
+            self._loaded.clear()
+        for model in models:
+            model.close()
+
+    def _estimate(self, path):
+        try:
+            return os.path.getsize(path) * self.copies if path else 0
+        except OSError:
+            return 0
+
+    def _evict_locked(self, reserve=0):
+        """Pop idle LRU models until the loaded set (plus reserve) fits the budget"""
+        evicted = []
+        used = sum(model.size_bytes for model in self._loaded.values())
+        for name in list(self._loaded):
+            if used + reserve <= self.memory_budget_bytes:
+                break
+            model = self._loaded[name]
+            if model.in_use:
+                continue
+            del self._loaded[name]
+            used -= model.size_bytes
+            evicted.append(model)
+        return evicted
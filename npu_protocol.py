@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# npu_protocol.py - Wire format shared by the NPU server and its clients
+"""
+Two wire modes are spoken on the same port:
+
+Legacy (one request per connection):
+    client -> server   uint32 LE payload size, payload
+    server -> client   uint32 LE result size, result   (then the server closes)
+
+Framed (persistent connection, many pipelined requests):
+    client -> server   MAGIC + 1 byte protocol version
+    server -> client   MAGIC + 1 byte version the server will speak
+    then both sides exchange frames:
+        header   FRAME_HEADER  (msg_type, status, meta_len, request_id, payload_len)
+        meta     meta_len bytes of UTF-8 JSON with per-request options (may be empty)
+        payload  payload_len bytes
+
+Sending MSG_STREAM_FRAME instead of MSG_REQUEST turns the connection into
+a latest-frame streaming session (see npu_stream.py).
+
+A framed client may first exchange MSG_HELLO frames to agree on payload
+compression and output encoding (see npu_codec.py).
+
+A request whose meta carries {"deadline_ms": 50} is answered STATUS_EXPIRED
+instead of being run if that budget, counted from the request's arrival,
+runs out before it reaches the NPU; once inference has started it runs to
+completion and is answered normally.  Requests still queued when a framed client disconnects are
+dropped without reaching the NPU.
+
+MAGIC read as a little-endian size is ~1.3 GB, far beyond any tensor a
+legacy client sends, so the server can tell the two modes apart from the
+first four bytes.  Responses carry the request_id of the request they
+answer, so a client may send several requests before reading any reply.
+"""
+import json
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from npu_codec import available_compressions, compress, decode_outputs, decompress
+
+MAGIC = b'RKNP'
+PROTOCOL_VERSION = 1
+
+# msg_type (B), status (B), meta_len (H), request_id (I), payload_len (I)
+FRAME_HEADER = struct.Struct('<BBHII')
+SIZE_HEADER = struct.Struct('<I')
+
+MSG_REQUEST = 1
+MSG_RESPONSE = 2
+MSG_HELLO = 3  # capability exchange: client offers, server answers with its choices
+MSG_STREAM_FRAME = 4  # streaming session input; request_id is the frame id (see npu_stream.py)
+MSG_STREAM_RESULT = 5
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BUSY = 2  # rejected by admission control before any work; safe to retry later or elsewhere
+STATUS_EXPIRED = 3  # deadline_ms passed before the request reached the NPU
+
+STATUS_NAMES = {STATUS_OK: 'ok', STATUS_ERROR: 'error', STATUS_BUSY: 'busy', STATUS_EXPIRED: 'expired'}
+
+MAX_PAYLOAD_SIZE = 64 * 1024 * 1024
+
+# buffer is the pooled bytearray backing payload (None when payload is plain bytes);
+# recv_seconds is the time from the header arriving to the last payload byte
+Frame = namedtuple('Frame', 'msg_type status request_id meta payload buffer recv_seconds',
+                   defaults=(None, 0.0))
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends something that is not valid on the wire"""
+
+
+class ServerBusy(ProtocolError):
+    """Raised when the server sheds a request (STATUS_BUSY); retry_after is in seconds or None"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(ProtocolError):
+    """Raised when the server skipped a request whose deadline_ms had passed (STATUS_EXPIRED)"""
+
+
+def recv_exact(sock, size):
+    """Receive exactly size bytes, or None if the peer closed first"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_into_exact(sock, view):
+    """Fill a writable memoryview from the socket; False if the peer closed first"""
+    received = 0
+    size = len(view)
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            return False
+        received += n
+    return True
+
+
+class BufferPool:
+    """Reusable receive buffers so request payloads are not reallocated per request
+
+    Buffers are bucketed by power-of-two capacity; acquire() returns a
+    bytearray at least as large as requested and the caller works on a
+    memoryview slice of it.  A buffer must only be released once nothing
+    (e.g. an in-flight NPU input array) still reads from it.
+    """
+
+    def __init__(self, max_per_size=16, min_size=4096):
+        self.max_per_size = max_per_size
+        self.min_size = min_size
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, size):
+        capacity = max(self.min_size, 1 << (size - 1).bit_length())
+        with self._lock:
+            free = self._free.get(capacity)
+            if free:
+                return free.pop()
+        return bytearray(capacity)
+
+    def release(self, buffer):
+        with self._lock:
+            free = self._free.setdefault(len(buffer), [])
+            if len(free) < self.max_per_size:
+                free.append(buffer)
+
+
+def _byte_views(buffers):
+    views = []
+    for buf in buffers:
+        view = memoryview(buf)
+        if view.nbytes:
+            views.append(view.cast('B') if view.format != 'B' or view.ndim != 1 else view)
+    return views
+
+
+def _advance(views, sent):
+    """Drop what sendmsg already wrote from the front of views"""
+    while sent:
+        if sent >= len(views[0]):
+            sent -= len(views.pop(0))
+        else:
+            views[0] = views[0][sent:]
+            sent = 0
+
+
+def send_buffers(sock, buffers):
+    """Write several buffers (bytes, memoryviews, contiguous arrays) without joining them
+
+    Uses scatter-gather sendmsg where available so a response header and the
+    output arrays go out in one syscall without being copied into one bytes.
+    """
+    views = _byte_views(buffers)
+    if not hasattr(sock, 'sendmsg'):
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        _advance(views, sock.sendmsg(views))
+
+
+def payload_size(payload):
+    """Total bytes in a payload given as one buffer or a list of buffers"""
+    if isinstance(payload, (list, tuple)):
+        return sum(memoryview(buf).nbytes for buf in payload)
+    return memoryview(payload).nbytes
+
+
+def pack_meta(meta):
+    """Encode a per-request options dict as compact JSON"""
+    if not meta:
+        return b''
+    raw = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    if len(raw) > 0xFFFF:
+        raise ProtocolError(f"Frame metadata too large: {len(raw)} bytes")
+    return raw
+
+
+def unpack_meta(raw):
+    """Decode the JSON options block of a frame"""
+    if not raw:
+        return {}
+    try:
+        meta = json.loads(raw.decode('utf-8'))
+    except ValueError as e:
+        raise ProtocolError(f"Bad frame metadata: {e}")
+    if not isinstance(meta, dict):
+        raise ProtocolError(f"Frame metadata must be a JSON object, got {type(meta).__name__}")
+    return meta
+
+
+def read_frame(sock, pool=None):
+    """Read one frame; returns None on a clean close between frames
+
+    With a BufferPool the payload is received straight into a pooled buffer
+    and returned as a memoryview; release frame.buffer to the pool when done.
+    """
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    started = time.perf_counter()
+    msg_type, status, meta_len, request_id, payload_len = FRAME_HEADER.unpack(header)
+    if payload_len > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload too large: {payload_len} bytes")
+
+    meta = b''
+    if meta_len:
+        meta = recv_exact(sock, meta_len)
+        if meta is None:
+            raise ProtocolError("Connection closed inside frame metadata")
+
+    payload = b''
+    buffer = None
+    if payload_len:
+        if pool is not None:
+            buffer = pool.acquire(payload_len)
+            payload = memoryview(buffer)[:payload_len]
+            complete = recv_into_exact(sock, payload)
+        else:
+            payload = recv_exact(sock, payload_len)
+            complete = payload is not None
+        if not complete:
+            if buffer is not None:
+                pool.release(buffer)
+            raise ProtocolError("Connection closed inside frame payload")
+
+    return Frame(msg_type, status, request_id, unpack_meta(meta), payload, buffer,
+                 time.perf_counter() - started)
+
+
+def write_frame(sock, msg_type, request_id, payload=b'', status=STATUS_OK, meta=None):
+    """Write one frame; payload may be a single buffer or a list of buffers"""
+    raw_meta = pack_meta(meta)
+    header = FRAME_HEADER.pack(msg_type, status, len(raw_meta), request_id, payload_size(payload))
+    buffers = list(payload) if isinstance(payload, (list, tuple)) else [payload]
+    send_buffers(sock, [header + raw_meta] + buffers)
+
+
+def client_handshake(sock, version=PROTOCOL_VERSION):
+    """Switch a fresh connection to framed mode; returns the agreed version"""
+    sock.sendall(MAGIC + bytes([version]))
+    reply = recv_exact(sock, len(MAGIC) + 1)
+    if reply is None or reply[:len(MAGIC)] != MAGIC:
+        raise ProtocolError("Server does not speak the framed protocol")
+    return reply[len(MAGIC)]
+
+
+def negotiate_version(requested):
+    """Pick the protocol version to speak given the client's version byte"""
+    if requested is None:
+        raise ProtocolError("Connection closed during handshake")
+    version = min(requested[0], PROTOCOL_VERSION)
+    if version < 1:
+        raise ProtocolError(f"Unsupported protocol version: {requested[0]}")
+    return version
+
+
+def server_handshake(sock):
+    """Answer a client preamble (MAGIC already consumed); returns the agreed version"""
+    version = negotiate_version(recv_exact(sock, 1))
+    sock.sendall(MAGIC + bytes([version]))
+    return version
+
+
+# asyncio variants for non-blocking sockets driven by an event loop
+
+async def async_recv_exact(loop, sock, size):
+    """Receive exactly size bytes, or None if the peer closed first"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = await loop.sock_recv(sock, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+async def async_recv_into_exact(loop, sock, view):
+    """Fill a writable memoryview from the socket; False if the peer closed first"""
+    received = 0
+    size = len(view)
+    while received < size:
+        n = await loop.sock_recv_into(sock, view[received:])
+        if n == 0:
+            return False
+        received += n
+    return True
+
+
+async def async_send_buffers(loop, sock, buffers):
+    """send_buffers for a non-blocking socket driven by an event loop"""
+    views = _byte_views(buffers)
+    if hasattr(sock, 'sendmsg'):
+        # Usually the whole response fits in the socket buffer in one go
+        try:
+            _advance(views, sock.sendmsg(views))
+        except (BlockingIOError, InterruptedError):
+            pass
+    for view in views:
+        await loop.sock_sendall(sock, view)
+
+
+async def async_server_handshake(loop, sock):
+    """Answer a client preamble (MAGIC already consumed); returns the agreed version"""
+    version = negotiate_version(await async_recv_exact(loop, sock, 1))
+    await loop.sock_sendall(sock, MAGIC + bytes([version]))
+    return version
+
+
+async def async_read_frame(loop, sock, pool=None):
+    """Read one frame; returns None on a clean close between frames (see read_frame)"""
+    header = await async_recv_exact(loop, sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    started = time.perf_counter()
+    msg_type, status, meta_len, request_id, payload_len = FRAME_HEADER.unpack(header)
+    if payload_len > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload too large: {payload_len} bytes")
+
+    meta = b''
+    if meta_len:
+        meta = await async_recv_exact(loop, sock, meta_len)
+        if meta is None:
+            raise ProtocolError("Connection closed inside frame metadata")
+
+    payload = b''
+    buffer = None
+    if payload_len:
+        if pool is not None:
+            buffer = pool.acquire(payload_len)
+            payload = memoryview(buffer)[:payload_len]
+            complete = await async_recv_into_exact(loop, sock, payload)
+        else:
+            payload = await async_recv_exact(loop, sock, payload_len)
+            complete = payload is not None
+        if not complete:
+            if buffer is not None:
+                pool.release(buffer)
+            raise ProtocolError("Connection closed inside frame payload")
+
+    return Frame(msg_type, status, request_id, unpack_meta(meta), payload, buffer,
+                 time.perf_counter() - started)
+
+
+async def async_write_frame(loop, sock, msg_type, request_id, payload=b'', status=STATUS_OK, meta=None):
+    """Write one frame; payload may be a single buffer or a list of buffers"""
+    raw_meta = pack_meta(meta)
+    header = FRAME_HEADER.pack(msg_type, status, len(raw_meta), request_id, payload_size(payload))
+    buffers = list(payload) if isinstance(payload, (list, tuple)) else [payload]
+    await async_send_buffers(loop, sock, [header + raw_meta] + buffers)
+
+
+def check_status(frame):
+    """Raise for a response frame that carries no result"""
+    if frame.status == STATUS_BUSY:
+        retry_after = frame.meta.get('retry_after_ms')
+        raise ServerBusy(f"Server busy ({frame.meta.get('reason', 'overloaded')})",
+                         retry_after / 1000 if retry_after is not None else None)
+    if frame.status == STATUS_EXPIRED:
+        raise DeadlineExceeded(frame.meta.get('error', 'deadline exceeded'))
+    if frame.status != STATUS_OK:
+        raise ProtocolError(frame.meta.get('error', f"Request failed with status {frame.status}"))
+
+
+def legacy_infer(host, port, payload, timeout=None):
+    """One request over a fresh legacy-mode connection; returns the result bytes"""
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        send_buffers(sock, [SIZE_HEADER.pack(payload_size(payload)), payload])
+        header = recv_exact(sock, SIZE_HEADER.size)
+        if header is None:
+            raise ProtocolError("Server closed the connection")
+        result = recv_exact(sock, SIZE_HEADER.unpack(header)[0])
+        if result is None:
+            raise ProtocolError("Connection closed inside result")
+        return result
+
+
+class NPUClient:
+    """Persistent framed-mode connection to an NPU server
+
+    compression ('lz4', 'zstd', 'zlib' or 'auto' for the best both sides
+    have) and output_dtype ('float16', 'int8') are negotiated with the
+    server on connect and then applied by infer() and infer_arrays().
+    """
+
+    def __init__(self, host, port=8080, timeout=None, compression=None, output_dtype=None):
+        self.address = (host, port)
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.version = client_handshake(self.sock)
+        self._next_id = 1
+        self.compression = None
+        self.output_dtype = None
+        if compression or output_dtype:
+            self.negotiate(compression, output_dtype)
+
+    def negotiate(self, compression=None, output_dtype=None):
+        """Agree on compression and output encoding with the server"""
+        if compression == 'auto':
+            offered = available_compressions()
+        else:
+            offered = [compression] if compression else []
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        write_frame(self.sock, MSG_HELLO, request_id, meta={
+            'compression': offered, 'output_dtypes': [output_dtype] if output_dtype else []})
+        reply = self.recv_response()
+        if reply.msg_type != MSG_HELLO or reply.status != STATUS_OK:
+            raise ProtocolError("Server does not support capability negotiation")
+        self.compression = reply.meta.get('compression')
+        self.output_dtype = reply.meta.get('output_dtype')
+        if compression and compression != 'auto' and self.compression != compression:
+            raise ProtocolError(f"Server does not support {compression} compression")
+        if output_dtype and self.output_dtype != output_dtype:
+            raise ProtocolError(f"Server does not support {output_dtype} outputs")
+
+    def send_request(self, payload, meta=None):
+        """Send a request without waiting for its reply; returns its request_id"""
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        write_frame(self.sock, MSG_REQUEST, request_id, payload, meta=meta)
+        return request_id
+
+    def recv_response(self):
+        """Read the next response frame (in whatever order the server sends them)"""
+        frame = read_frame(self.sock)
+        if frame is None:
+            raise ProtocolError("Server closed the connection")
+        return frame
+
+    def request(self, payload, meta=None):
+        """Send one request and wait for its response frame (whatever its status)"""
+        request_id = self.send_request(payload, meta)
+        frame = self.recv_response()
+        if frame.request_id != request_id:
+            raise ProtocolError(f"Response for request {frame.request_id}, expected {request_id}")
+        return frame
+
+    def infer(self, payload, meta=None):
+        """Send one request and wait for its result bytes (float32, however they were sent)"""
+        frame = self._encoded_request(payload, meta)
+        if frame.meta.get('dtype', 'float32') == 'float32':
+            return frame.payload
+        return np.concatenate(decode_outputs(frame.payload, frame.meta)).tobytes()
+
+    def infer_arrays(self, payload, meta=None):
+        """Send one request and wait for its outputs as a list of float32 arrays"""
+        frame = self._encoded_request(payload, meta)
+        return decode_outputs(frame.payload, frame.meta)
+
+    def _encoded_request(self, payload, meta):
+        """request() with the negotiated encodings applied; the payload comes back decompressed"""
+        meta = dict(meta or {})
+        if self.compression:
+            payload = compress(self.compression, payload)
+            meta['compression'] = meta['accept_compression'] = self.compression
+        if self.output_dtype:
+            meta['output_dtype'] = self.output_dtype
+
+        frame = self.request(payload, meta)
+        check_status(frame)
+        if frame.meta.get('compression'):
+            frame = frame._replace(payload=decompress(frame.meta['compression'], frame.payload,
+                                                      MAX_PAYLOAD_SIZE))
+        return frame
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
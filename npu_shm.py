@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# npu_shm.py - Shared-memory transport for clients on the same board as the NPU server
+"""
+Co-located clients (camera ingest on the RK3588 itself) can skip loopback
+TCP entirely.  The client creates a shared memory segment split into
+fixed-size slots and connects to the server's Unix domain socket, which
+speaks the framed protocol (npu_protocol.py) with empty payloads:
+
+    client -> server   MSG_HELLO    {"shm": name, "slots": 4, "slot_size": 4194304}
+    client -> server   MSG_REQUEST  {"slot": 2, "size": 150528, ...request meta}
+    server -> client   MSG_RESPONSE {"slot": 2, "size": 4000, ...response meta}
+
+The input tensor is read by the server straight out of the slot, and the
+outputs are written back into the same slot, so tensors never pass through
+the kernel socket path.  A slot belongs to the server from request until
+response.
+
+The server only maps regular /dev/shm files owned by the connecting
+process's user (SO_PEERCRED), and its default socket lives in a private
+runtime directory.
+"""
+import mmap
+import os
+import re
+import socket
+import stat
+import struct
+import threading
+from multiprocessing import shared_memory
+
+from npu_codec import decode_outputs
+from npu_protocol import (
+    MSG_HELLO, MSG_REQUEST, STATUS_OK, ProtocolError, check_status, client_handshake, read_frame,
+    write_frame,
+)
+
+RUNTIME_DIR = os.environ.get('XDG_RUNTIME_DIR') or f'/tmp/rk3588-npu-{os.getuid()}'
+DEFAULT_SOCKET = os.path.join(RUNTIME_DIR, 'rk3588-npu.sock')
+SEGMENT_NAME = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def peer_uid(conn):
+    """User id of the process at the other end of a Unix socket"""
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+class AttachedSegment:
+    """A segment another process created, mapped without adopting it
+
+    SharedMemory(name=...) would register the segment with this process's
+    resource tracker (before Python 3.13), which unlinks it when the server
+    exits while the client still uses it, and its close() fails while any
+    request array still points into the mapping.  A plain mmap of the
+    /dev/shm file has neither problem: it is unmapped once the last view is
+    gone.
+
+    The name comes from the client, so it must be a plain segment name
+    (no path), and with owner_uid the file must be a regular file that
+    user owns - never a symlink or another user's file.
+    """
+
+    def __init__(self, name, owner_uid=None):
+        name = name[1:] if isinstance(name, str) and name.startswith('/') else name
+        if not isinstance(name, str) or not SEGMENT_NAME.fullmatch(name):
+            raise ProtocolError(f"Invalid shared memory segment name {name!r}")
+        self.name = name
+        fd = os.open(os.path.join('/dev/shm', name), os.O_RDWR | os.O_NOFOLLOW)
+        try:
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode):
+                raise ProtocolError(f"Shared memory segment {name} is not a regular file")
+            if owner_uid is not None and info.st_uid != owner_uid:
+                raise ProtocolError(f"Shared memory segment {name} is not owned by the client")
+            self.size = info.st_size
+            self.buf = memoryview(mmap.mmap(fd, self.size))
+        finally:
+            os.close(fd)
+
+    def close(self):
+        # Views handed out (request arrays, cached slices) keep the mapping alive
+        self.buf = None
+
+
+class ShmListener:
+    """Accept Unix socket connections and serve each on its own thread"""
+
+    def __init__(self, path, serve, backlog=16):
+        self.path = path
+        self.serve = serve
+        if os.path.dirname(path) == RUNTIME_DIR:
+            os.makedirs(RUNTIME_DIR, mode=0o700, exist_ok=True)
+            info = os.lstat(RUNTIME_DIR)
+            if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+                raise PermissionError(f"{RUNTIME_DIR} is not a private directory of this user")
+        try:
+            # Only replace a stale socket, never some other file at the path
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError(f"{path} exists and is not a socket")
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(backlog)
+        self.thread = threading.Thread(target=self._accept_loop, name='npu-shm', daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+        try:
+            if stat.S_ISSOCK(os.lstat(self.path).st_mode):
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ShmClient:
+    """Shared-memory connection to a co-located NPU server
+
+    For no copies at all, write the input straight into slot(next_slot())
+    and call submit() with its size.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, slots=4, slot_size=4 * 1024 * 1024, timeout=None):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.segment = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self._next_slot = 0
+        self._next_id = 1
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(path)
+            client_handshake(self.sock)
+            write_frame(self.sock, MSG_HELLO, 0, meta={
+                'shm': self.segment.name, 'slots': slots, 'slot_size': slot_size})
+            reply = read_frame(self.sock)
+            if reply is None or reply.msg_type != MSG_HELLO or reply.status != STATUS_OK:
+                raise ProtocolError("Server refused the shared memory segment")
+        except BaseException:
+            self.segment.close()
+            self.segment.unlink()
+            raise
+
+    def slot(self, index):
+        """Writable view of one slot, e.g. to decode a camera frame straight into it"""
+        start = index * self.slot_size
+        return self.segment.buf[start:start + self.slot_size]
+
+    def next_slot(self):
+        index = self._next_slot
+        self._next_slot = (index + 1) % self.slots
+        return index
+
+    def submit(self, index, size, meta=None):
+        """Run the request already written into slot[:size]; returns the response Frame"""
+        request_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        meta = dict(meta or {}, slot=index, size=size)
+        write_frame(self.sock, MSG_REQUEST, request_id, meta=meta)
+        frame = read_frame(self.sock)
+        if frame is None:
+            raise ProtocolError("Server closed the connection")
+        check_status(frame)
+        return frame
+
+    def infer_arrays(self, payload, meta=None, copy=True):
+        """Copy one input into the next slot and return its outputs as float32 arrays
+
+        With copy=False the arrays are views into the slot: no copy, but they
+        are only valid until the slot is reused (slots - 1 requests later) and
+        must be dropped before close().
+        """
+        size = len(memoryview(payload).cast('B'))
+        if size > self.slot_size:
+            raise ValueError(f"Input of {size} bytes does not fit a {self.slot_size} byte slot")
+        index = self.next_slot()
+        view = self.slot(index)
+        view[:size] = memoryview(payload).cast('B')
+        frame = self.submit(index, size, meta)
+        outputs = decode_outputs(view[:frame.meta['size']], frame.meta)
+        return [output.copy() for output in outputs] if copy else outputs
+
+    def infer(self, payload, meta=None):
+        """Like NPUClient.infer(): the float32 result bytes (a copy)"""
+        return b''.join(output.tobytes() for output in self.infer_arrays(payload, meta, copy=False))
+
+    def close(self):
+        self.sock.close()
+        self.segment.unlink()
+        self.segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# npu_stream.py - Streaming sessions with latest-frame semantics for live video
+"""
+A framed connection becomes a stream when the client sends MSG_STREAM_FRAME
+instead of MSG_REQUEST.  The client pushes frames as fast as it captures
+them without waiting for replies; the server keeps only the newest frame
+not yet started, so a slow NPU drops stale frames instead of queueing them
+and results always describe the most recent picture.  Results come back as
+MSG_STREAM_RESULT frames carrying the frame's request_id (its frame id):
+
+    server -> client   MSG_STREAM_RESULT  {"dropped": 3, "queued_ms": 4.1, ...response meta}
+
+dropped counts the frames skipped since the previous result.
+"""
+import queue
+import socket
+import threading
+import time
+
+from npu_protocol import (
+    MSG_STREAM_FRAME, MSG_STREAM_RESULT, STATUS_OK, NPUClient, ProtocolError, read_frame, write_frame,
+)
+
+
+class LatestFrameSlot:
+    """Holds at most one pending item; putting a new one evicts the old"""
+
+    def __init__(self):
+        self._item = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Store item; returns the item it replaced (a dropped frame) or None"""
+        with self._cond:
+            dropped, self._item = self._item, item
+            self._cond.notify()
+            return dropped
+
+    def take(self):
+        """Wait for the newest item; None once closed"""
+        with self._cond:
+            while self._item is None and not self._closed:
+                self._cond.wait()
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        """Stop take() and return whatever was still pending"""
+        with self._cond:
+            self._closed = True
+            item, self._item = self._item, None
+            self._cond.notify_all()
+            return item
+
+
+class StreamSession:
+    """Server side of one stream: infers on the newest frame, drops the rest
+
+    process(frame) -> (status, results, meta) runs the inference,
+    send(frame_id, status, results, meta) writes a result, and
+    release(frame) returns a frame's buffer once it is done with or dropped.
+    """
+
+    def __init__(self, process, send, release):
+        self.process = process
+        self.send = send
+        self.release = release
+        self.received = 0
+        self.dropped = 0
+        self.completed = 0
+        self._dropped_since_result = 0
+        self._lock = threading.Lock()
+        self._slot = LatestFrameSlot()
+        self._thread = threading.Thread(target=self._run, name='npu-stream', daemon=True)
+        self._thread.start()
+
+    def push(self, frame):
+        """Offer a newly received frame; returns False for a frame that was dropped"""
+        self.received += 1
+        stale = self._slot.put((frame, time.monotonic()))
+        if stale is not None:
+            self._drop(stale[0])
+        return stale is None
+
+    def _drop(self, frame):
+        with self._lock:
+            self.dropped += 1
+            self._dropped_since_result += 1
+        self.release(frame)
+
+    def _run(self):
+        while True:
+            item = self._slot.take()
+            if item is None:
+                break
+            frame, queued_at = item
+            queued_ms = (time.monotonic() - queued_at) * 1000
+            try:
+                status, results, meta = self.process(frame)
+            finally:
+                self.release(frame)
+            with self._lock:
+                dropped, self._dropped_since_result = self._dropped_since_result, 0
+            meta = dict(meta or {}, dropped=dropped, queued_ms=round(queued_ms, 3))
+            try:
+                self.send(frame.request_id, status, results, meta)
+            except OSError:
+                break
+            self.completed += 1
+
+    def close(self):
+        """Finish the frame in progress and discard the one waiting"""
+        pending = self._slot.close()
+        if pending is not None:
+            self._drop(pending[0])
+        self._thread.join()
+
+
+class StreamClient:
+    """Client side of a stream: send() frames freely, read results as they arrive
+
+    Results are queued by a background reader as (frame_id, result bytes,
+    meta) tuples; a failed frame has None in place of the bytes.
+    """
+
+    def __init__(self, host, port=8080, timeout=None, meta=None):
+        self.client = NPUClient(host, port, timeout=timeout)
+        self.meta = meta
+        self.results = queue.Queue()
+        self._next_id = 1
+        self._reader = threading.Thread(target=self._read_results, name='npu-stream-reader',
+                                        daemon=True)
+        self._reader.start()
+
+    def send(self, payload, meta=None):
+        """Push one frame without waiting; returns its frame id"""
+        frame_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        write_frame(self.client.sock, MSG_STREAM_FRAME, frame_id, payload, meta=meta or self.meta)
+        return frame_id
+
+    def recv(self, timeout=None):
+        """The next (frame_id, result bytes, meta); raises queue.Empty on timeout"""
+        result = self.results.get(timeout=timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _read_results(self):
+        while True:
+            try:
+                frame = read_frame(self.client.sock)
+            except (OSError, ProtocolError) as e:
+                self.results.put(e)
+                return
+            if frame is None:
+                self.results.put(ProtocolError("Server closed the stream"))
+                return
+            if frame.msg_type != MSG_STREAM_RESULT:
+                continue
+            payload = frame.payload if frame.status == STATUS_OK else None
+            self.results.put((frame.request_id, payload, frame.meta))
+
+    def close(self):
+        try:
+            self.client.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
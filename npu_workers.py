@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# npu_workers.py - One NPU runtime per RK3588 core, scheduled as a worker pool
+import queue
+import threading
+
+from npu_batcher import InferenceJob
+
+# RKNNLite core_mask values (RKNNLite.NPU_CORE_*)
+CORE_MASKS = {
+    'auto': 0,
+    '0': 1,
+    '1': 2,
+    '2': 4,
+    '0_1': 3,
+    '0_1_2': 7,
+    'all': 7,
+}
+
+
+def parse_core_masks(spec):
+    """Parse a core list such as '0,1,2' or '0_1_2' into RKNNLite core masks"""
+    masks = []
+    for name in spec.split(','):
+        name = name.strip()
+        if name not in CORE_MASKS:
+            raise ValueError(f"Unknown NPU core '{name}' (choose from {', '.join(CORE_MASKS)})")
+        masks.append(CORE_MASKS[name])
+    return masks
+
+
+class NPUWorker:
+    """A thread that owns one runtime and runs the batches queued for it"""
+
+    def __init__(self, pool, index, runtime, core_mask):
+        self.pool = pool
+        self.index = index
+        self.runtime = runtime
+        self.core_mask = core_mask
+        self.depth = 0  # jobs queued or running on this core
+        self.completed = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name=f'npu-core-{index}', daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while True:
+            jobs = self.queue.get()
+            if jobs is None:
+                return
+            try:
+                self.pool.run_jobs(self.runtime, jobs)
+            except Exception as e:
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            finally:
+                self.pool._finished(self, len(jobs))
+
+
+class NPUWorkerPool:
+    """Schedule job batches onto the least-loaded NPU runtime
+
+    run_jobs(runtime, jobs) is called on the worker's own thread and must
+    resolve every job's future.  A runtime of None is a simulated core.
+    Dispatch blocks while every core already holds max_depth jobs, which
+    pushes back on the batcher / client threads instead of queueing forever.
+    """
+
+    def __init__(self, runtimes, core_masks, run_jobs, max_depth=4):
+        self.run_jobs = run_jobs
+        self.max_depth = max_depth
+        self._cond = threading.Condition()
+        self.workers = [NPUWorker(self, i, runtime, mask)
+                        for i, (runtime, mask) in enumerate(zip(runtimes, core_masks))]
+
+    @property
+    def depths(self):
+        """Per-core queue depth (jobs queued or running)"""
+        return [worker.depth for worker in self.workers]
+
+    def dispatch(self, jobs, block=True, timeout=None):
+        """Queue a list of jobs on the core with the fewest outstanding jobs"""
+        with self._cond:
+            def has_room():
+                return min(worker.depth for worker in self.workers) < self.max_depth
+            if not has_room():
+                if not block or not self._cond.wait_for(has_room, timeout):
+                    raise queue.Full
+            worker = min(self.workers, key=lambda w: w.depth)
+            worker.depth += len(jobs)
+        worker.queue.put(jobs)
+        return worker
+
+    def submit(self, array, block=True, timeout=None, deadline=None):
+        """Queue a single input; returns its InferenceJob"""
+        job = InferenceJob(array, deadline)
+        self.dispatch([job], block=block, timeout=timeout)
+        return job
+
+    def _finished(self, worker, count):
+        with self._cond:
+            worker.depth -= count
+            worker.completed += count
+            self._cond.notify_all()
+
+    def close(self):
+        """Drain queued work, stop the worker threads and release the runtimes"""
+        for worker in self.workers:
+            worker.queue.put(None)
+        for worker in self.workers:
+            worker.thread.join()
+            if worker.runtime is not None:
+                worker.runtime.release()
@@ -1,171 +1,728 @@
 #!/usr/bin/env python3
 # simple_rk3588_test.py - Test server for Orange Pi 5
+import argparse
+import asyncio
+import logging
+import queue
 import socket
 import threading
 import time
 import numpy as np
-import sys
 import os
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 
-# Try to import RKNN
+from npu_admission import AdmissionController
+from npu_batcher import Cancelled, Deadline, DynamicBatcher
+from npu_cache import ResultCache, cache_key
+from npu_codec import (
+    OUTPUT_DTYPES, CodecError, available_compressions, choose, compress, decompress, encode_outputs,
+)
+from npu_logging import fields, get_logger, setup_logging, shutdown_logging
+from npu_metrics import Counter, Gauge, Histogram, start_metrics_server
+from npu_models import LoadedModel, ModelRegistry
+from npu_preprocess import DEFAULT_SPEC, InputSpec, PreprocessError, Preprocessor
+from npu_protocol import (
+    MAGIC, MAX_PAYLOAD_SIZE, MSG_HELLO, MSG_REQUEST, MSG_RESPONSE, MSG_STREAM_FRAME,
+    MSG_STREAM_RESULT, SIZE_HEADER, STATUS_BUSY, STATUS_ERROR, STATUS_EXPIRED, STATUS_NAMES,
+    STATUS_OK, ProtocolError,
+    BufferPool, async_read_frame, async_recv_exact, async_recv_into_exact, async_send_buffers,
+    async_server_handshake, async_write_frame, payload_size, read_frame, recv_exact, recv_into_exact,
+    send_buffers, server_handshake, write_frame,
+)
+from npu_shm import DEFAULT_SOCKET, AttachedSegment, ShmListener, peer_uid
+from npu_stream import StreamSession
+from npu_workers import NPUWorkerPool, parse_core_masks
+
+# Try to import RKNN (never install at import time - provision the board instead)
 try:
     from rknnlite.api import RKNNLite
     RKNN_AVAILABLE = True
     print("✓ RKNN library imported successfully")
 except ImportError as e:
+    RKNNLite = None
+    RKNN_AVAILABLE = False
     print(f"✗ RKNN library not available: {e}")
-    print("Installing rknnlite...")
-    os.system("pip3 install rknnlite")
-    try:
-        from rknnlite.api import RKNNLite
-        RKNN_AVAILABLE = True
-        print("✓ RKNN library installed and imported")
-    except ImportError:
-        RKNN_AVAILABLE = False
-        print("✗ Could not install RKNN library")
+    print("  Install rknn-toolkit-lite2 (rknnlite) on the board; serving simulated inference")
+
+# Time-to-ready is measured from here to the listening socket
+STARTED = time.monotonic()
+
+log = get_logger('server')
+request_log = get_logger('request')
+
+# Serving metrics (scraped from --metrics-port)
+STAGE_SECONDS = Histogram('npu_stage_seconds', "Seconds a request spends in each serving stage", ['stage'])
+RECEIVE_SECONDS = STAGE_SECONDS.labels('receive')
+QUEUE_WAIT_SECONDS = STAGE_SECONDS.labels('queue_wait')
+PREPROCESS_SECONDS = STAGE_SECONDS.labels('preprocess')
+INFERENCE_SECONDS = STAGE_SECONDS.labels('inference')
+SERIALIZE_SECONDS = STAGE_SECONDS.labels('serialize')
+SEND_SECONDS = STAGE_SECONDS.labels('send')
+READY = Gauge('npu_ready', "1 once models are loaded and warmed up and the server accepts clients")
+TIME_TO_READY = Gauge('npu_time_to_ready_seconds', "Seconds from start-up to accepting clients")
+BATCH_SIZE = Histogram('npu_batch_size', "Requests per NPU call", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+REQUESTS = Counter('npu_requests_total', "Requests answered", ['mode', 'status'])
+CANCELLED = Counter('npu_cancelled_requests_total',
+                    "Requests dropped before inference: deadline expired or client disconnected", ['reason'])
+REJECTED = Counter('npu_rejected_requests_total', "Requests shed by admission control", ['reason'])
+CONNECTIONS = Gauge('npu_connections_in_flight', "Client connections currently open")
+BYTES_RECEIVED = Counter('npu_received_bytes_total', "Request bytes received")
+BYTES_SENT = Counter('npu_sent_bytes_total', "Response bytes sent")
+STREAM_DROPPED = Counter('npu_stream_dropped_frames_total', "Stream frames skipped for a newer one")
+CACHE_LOOKUPS = Counter('npu_cache_lookups_total', "Result cache lookups", ['result'])
+CACHE_HITS = CACHE_LOOKUPS.labels('hit')
+CACHE_MISSES = CACHE_LOOKUPS.labels('miss')
+CACHE_BYTES = Gauge('npu_cache_bytes', "Bytes of outputs held in the result cache")
 
 class SimpleRK3588Server:
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, batch_size=1, batch_wait_ms=2.0, core_masks=(1, 2, 4),
+                 models=None, model_dir=None, npu_memory_mb=1024, input_specs=None,
+                 cache_mb=0, cache_ttl=None, pipeline_depth=4, stage_workers=64,
+                 warmup_runs=1, preload=(), max_pending=None, client_rate=None, client_burst=None):
         self.model_path = model_path
-        self.rknn = None
         self.model_loaded = False
+        self.batch_size = batch_size
+        self.batch_wait_ms = batch_wait_ms
+        self.warmup_runs = warmup_runs
+        self.core_masks = list(core_masks)
+        self.buffers = BufferPool()
+        # Requests a framed connection may have between receive and send, and the
+        # threads that carry them through preprocessing and the NPU
+        self.pipeline_depth = pipeline_depth
+        self.stages = ThreadPoolExecutor(max_workers=stage_workers, thread_name_prefix='npu-stage')
+        # Under overload, shed requests up front instead of queueing them behind the NPU
+        self.admission = None
+        if max_pending or client_rate:
+            self.admission = AdmissionController(max_pending, client_rate, client_burst)
+        self.input_specs = dict(input_specs or {})
+        self.preprocessors = {}
+        # Repeated inputs (static scenes, retries) are answered without the NPU
+        self.cache = ResultCache(cache_mb * 1024 * 1024, cache_ttl) if cache_mb else None
+        
+        # Every model gets one runtime per NPU core, loaded on first use
+        self.registry = ModelRegistry(self.load_runtimes, npu_memory_mb * 1024 * 1024,
+                                      copies=len(self.core_masks))
+        if model_dir:
+            self.registry.register_directory(model_dir)
+        for name, path in (models or {}).items():
+            self.registry.register(name, path)
         
         if RKNN_AVAILABLE and model_path and os.path.exists(model_path):
-            self.load_model()
-        elif model_path:
-            print(f"Model file not found: {model_path}")
+            self.default_model = os.path.splitext(os.path.basename(model_path))[0]
+            self.registry.register(self.default_model, model_path)
+        else:
+            if model_path:
+                print(f"Model file not found: {model_path}")
+            else:
+                print("No model specified - running in test mode")
+            # Simulated cores so the serving stack behaves like the real board
+            self.default_model = 'simulated'
+            self.registry.register(self.default_model, None)
+        
+        # An input spec given without a model name is for the default model
+        if None in self.input_specs:
+            self.input_specs[self.default_model] = self.input_specs.pop(None)
+        
+        if self.registry.paths:
+            print(f"📚 Models: {', '.join(sorted(self.registry.paths))} (default: {self.default_model})")
+        
+        # The default model (and any --preload ones) is loaded and warmed up before
+        # the socket opens, the rest lazily on first use
+        startup = [self.default_model] + [name for name in preload if name != self.default_model]
+        for name in startup:
+            model = self.registry.acquire(name)
+            if name == self.default_model:
+                self.model_loaded = not model.simulated
+            self.registry.release(model)
+    
+    def load_runtimes(self, name, model_path):
+        """Create the worker pool (and batcher) serving one model; the registry's loader"""
+        runtimes = []
+        if RKNN_AVAILABLE and model_path:
+            # One runtime per NPU core (each holds its own copy of the model)
+            for core_mask in self.core_masks:
+                runtime = self.load_model(core_mask, model_path)
+                if runtime is None:
+                    for loaded in runtimes:
+                        loaded.release()
+                    raise RuntimeError(f"Could not load model '{name}' from {model_path}")
+                runtimes.append(runtime)
+            size_bytes = os.path.getsize(model_path) * len(runtimes)
         else:
-            print("No model specified - running in test mode")
+            runtimes = [None] * len(self.core_masks)
+            size_bytes = 0
+        
+        if self.warmup_runs and RKNN_AVAILABLE and model_path:
+            self.warm_up(name, runtimes)
+        
+        pool = NPUWorkerPool(runtimes, self.core_masks, self.run_batch,
+                             max_depth=2 * self.batch_size)
+        print(f"🧠 Model '{name}': {len(runtimes)} runtime(s), core masks {self.core_masks}")
+        
+        batcher = None
+        if self.batch_size > 1:
+            # Concurrent clients are coalesced into one NPU call per batch
+            batcher = DynamicBatcher(pool.dispatch, max_batch_size=self.batch_size,
+                                     max_wait_ms=self.batch_wait_ms)
+            print(f"📦 Dynamic batching: up to {self.batch_size} requests / {self.batch_wait_ms} ms")
+        
+        return LoadedModel(name, model_path, pool, batcher, size_bytes)
+    
+    def warm_up(self, name, runtimes):
+        """Throwaway inferences on every runtime, so the first client doesn't pay lazy NPU setup"""
+        spec = self.preprocessor(name).spec
+        shape = (self.batch_size,) + spec.shape[1:] if self.batch_size > 1 else spec.shape
+        dummy = np.zeros(shape, dtype=spec.dtype)
+        
+        def run(runtime):
+            for _ in range(self.warmup_runs):
+                runtime.inference(inputs=[dummy])
+        
+        # The cores are independent, so warm them all at once
+        start_time = time.monotonic()
+        threads = [threading.Thread(target=run, args=(runtime,)) for runtime in runtimes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"🔥 Warmed up '{name}': {self.warmup_runs} run(s) on {len(runtimes)} runtime(s) "
+              f"in {(time.monotonic() - start_time) * 1000:.0f} ms")
+    
+    def mark_ready(self):
+        """Record and report time-to-ready once the socket is accepting"""
+        ready_seconds = time.monotonic() - STARTED
+        TIME_TO_READY.set(ready_seconds)
+        READY.set(1)
+        print(f"⏱️  Ready in {ready_seconds:.2f} s")
     
-    def load_model(self):
-        """Load RKNN model"""
+    def load_model(self, core_mask=0, model_path=None):
+        """Load RKNN model onto the given NPU core(s); returns the runtime or None"""
+        model_path = model_path or self.model_path
         try:
-            print(f"Loading model: {self.model_path}")
-            self.rknn = RKNNLite()
+            print(f"Loading model: {model_path} (core mask {core_mask})")
+            rknn = RKNNLite()
             
             # Load RKNN model
-            ret = self.rknn.load_rknn(self.model_path)
+            ret = rknn.load_rknn(model_path)
             if ret != 0:
                 print(f"✗ Failed to load RKNN model! Error code: {ret}")
-                return False
+                return None
             
             # Initialize runtime
             print("Initializing NPU runtime...")
-            ret = self.rknn.init_runtime()
+            ret = rknn.init_runtime(core_mask=core_mask)
             if ret != 0:
                 print(f"✗ Failed to init NPU runtime! Error code: {ret}")
-                return False
+                rknn.release()
+                return None
             
-            self.model_loaded = True
             print("✓ Model loaded successfully!")
-            return True
+            return rknn
             
         except Exception as e:
             print(f"✗ Error loading model: {e}")
-            return False
+            return None
     
-    def run_inference(self, input_data):
-        """Run inference on input data"""
-        if not self.model_loaded:
-            # Simulate inference for testing
-            print("Simulating inference (no model loaded)")
-            time.sleep(0.1)  # Simulate processing time
-            # Return dummy result
-            return np.random.rand(1000).astype(np.float32).tobytes()
-        
+    def preprocessor(self, model_name):
+        """The Preprocessor for a model's input spec (--input-spec, NAME.json sidecar or default)"""
+        preprocessor = self.preprocessors.get(model_name)
+        if preprocessor is None:
+            spec = (self.input_specs.get(model_name)
+                    or InputSpec.for_model(self.registry.paths.get(model_name))
+                    or DEFAULT_SPEC)
+            preprocessor = self.preprocessors.setdefault(model_name, Preprocessor(spec))
+        return preprocessor
+    
+    def prepare_input(self, input_data, model_name=None):
+        """Turn received bytes (raw tensor or JPEG/PNG image) into the model input tensor"""
+        return self.preprocessor(model_name or self.default_model).prepare(input_data)
+    
+    def infer(self, input_array, model_name=None, deadline=None):
+        """Run one input through the named model (default model if None); returns the outputs"""
+        model = self.registry.acquire(model_name or self.default_model)
         try:
-            # Convert input data to numpy array
-            if isinstance(input_data, bytes):
-                input_array = np.frombuffer(input_data, dtype=np.uint8)
-            else:
-                input_array = input_data
-            
-            print(f"Input data shape: {input_array.shape}")
-            
-            # For now, let's reshape to a common size (you'll need to adjust this)
-            # This is just for testing - replace with your model's input shape
+            job = model.submit(input_array, deadline)
+            remaining = deadline.remaining() if deadline is not None else None
             try:
-                input_array = input_array.reshape((1, 224, 224, 3))
-            except:
-                print("Warning: Could not reshape input, using as-is")
-            
-            # Run inference
+                return job.future.result(max(remaining, 0) if remaining is not None else None)
+            except FutureTimeout:
+                # Only a job still queued can be dropped: one already on the NPU is reading
+                # the request's buffer, which must not be released (or reused) under it
+                if job.future.cancel():
+                    CANCELLED.labels('expired').inc()
+                    raise Cancelled('expired')
+                return job.future.result()
+        finally:
+            self.registry.release(model)
+    
+    def run_single(self, runtime, job):
+        """Run one job on its own"""
+        try:
             start_time = time.time()
-            outputs = self.rknn.inference(inputs=[input_array])
-            end_time = time.time()
-            
-            inference_time = (end_time - start_time) * 1000
-            print(f"✓ Inference completed in {inference_time:.2f} ms")
-            
-            # Convert outputs to bytes
-            if outputs and len(outputs) > 0:
-                result_bytes = b''
-                for output in outputs:
-                    result_bytes += output.astype(np.float32).tobytes()
-                return result_bytes
+            outputs = runtime.inference(inputs=[job.array]) or []
+            INFERENCE_SECONDS.observe(time.time() - start_time)
+            BATCH_SIZE.observe(1)
+            inference_time = (time.time() - start_time) * 1000
+            request_log.debug("✓ Inference completed", extra=fields(ms=round(inference_time, 2)))
+            job.future.set_result(outputs)
+        except Exception as e:
+            job.future.set_exception(e)
+    
+    def run_batch(self, runtime, jobs):
+        """Run jobs on one NPU runtime (called on its worker thread) and resolve their futures"""
+        now = time.monotonic()
+        for job in jobs:
+            QUEUE_WAIT_SECONDS.observe(now - job.enqueued_at)
+        
+        # Nobody will read the result of an expired or abandoned job - skip it.  Marking
+        # the rest running stops infer() from giving up on them mid-inference.
+        live = []
+        for job in jobs:
+            if not job.future.set_running_or_notify_cancel():
+                continue  # infer() already gave up on it
+            reason = job.deadline.reason() if job.deadline is not None else None
+            if reason is None:
+                live.append(job)
             else:
-                print("No outputs from inference")
-                return b''
-                
+                CANCELLED.labels(reason).inc()
+                job.future.set_exception(Cancelled(reason))
+        jobs = live
+        if not jobs:
+            return
+        
+        if runtime is None:
+            # Simulate inference for testing - one simulated NPU call per batch
+            request_log.debug("Simulating inference (no model loaded)", extra=fields(batch=len(jobs)))
+            time.sleep(0.1)  # Simulate processing time
+            INFERENCE_SECONDS.observe(time.monotonic() - now)
+            BATCH_SIZE.observe(len(jobs))
+            for job in jobs:
+                job.future.set_result([np.random.rand(1000).astype(np.float32)])
+            return
+        
+        # Inputs were checked against the model's input spec, so they stack;
+        # anything that isn't a batch of one of the same shape runs alone
+        shape = jobs[0].array.shape
+        batchable = [job for job in jobs if job.array.shape == shape and shape[0] == 1]
+        for job in jobs:
+            if job not in batchable or self.batch_size == 1:
+                self.run_single(runtime, job)
+        if not batchable or self.batch_size == 1:
+            return
+        
+        # The model is converted for a fixed batch size, so pad partial batches
+        batch = np.zeros((self.batch_size,) + shape[1:], dtype=batchable[0].array.dtype)
+        for i, job in enumerate(batchable):
+            batch[i] = job.array[0]
+        
+        try:
+            start_time = time.time()
+            outputs = runtime.inference(inputs=[batch]) or []
+            INFERENCE_SECONDS.observe(time.time() - start_time)
+            BATCH_SIZE.observe(len(batchable))
+            inference_time = (time.time() - start_time) * 1000
+            request_log.debug("✓ Batch completed",
+                              extra=fields(batch=len(batchable), ms=round(inference_time, 2)))
         except Exception as e:
-            print(f"✗ Inference error: {e}")
-            return b''
+            for job in batchable:
+                job.future.set_exception(e)
+            return
+        
+        # Scatter: row i of every output belongs to job i
+        for i, job in enumerate(batchable):
+            job.future.set_result([output[i:i + 1] for output in outputs])
+    
+    def serialize_outputs(self, outputs):
+        """Outputs as float32 C-contiguous arrays, ready to be sent as-is"""
+        # No copy when the runtime already returned contiguous float32
+        return [np.ascontiguousarray(output, dtype=np.float32) for output in outputs]
+    
+    def process_request(self, input_data, model_name=None, use_cache=True, deadline=None):
+        """Preprocess, infer and serialize one input; returns the float32 outputs ([] if none)"""
+        if self.cache is not None and use_cache:
+            key = cache_key(model_name or self.default_model, input_data)
+            outputs = self.cache.get(key)
+            if outputs is not None:
+                CACHE_HITS.inc()
+                return outputs
+            CACHE_MISSES.inc()
+            outputs = self.compute_outputs(input_data, model_name, deadline)
+            if outputs:
+                self.cache.put(key, outputs)
+                CACHE_BYTES.set(self.cache.bytes)
+            return outputs
+        return self.compute_outputs(input_data, model_name, deadline)
+    
+    def compute_outputs(self, input_data, model_name=None, deadline=None):
+        """Run one input through preprocessing, the NPU and serialization"""
+        reason = deadline.reason() if deadline is not None else None
+        if reason is not None:
+            CANCELLED.labels(reason).inc()
+            raise Cancelled(reason)
+        with PREPROCESS_SECONDS.time():
+            input_array = self.prepare_input(input_data, model_name)
+        outputs = self.infer(input_array, model_name, deadline)
+        
+        if outputs and len(outputs) > 0:
+            with SERIALIZE_SECONDS.time():
+                return self.serialize_outputs(outputs)
+        request_log.warning("No outputs from inference")
+        return []
+    
+    def run_inference(self, input_data, model_name=None):
+        """Run inference on input data; returns the outputs as float32 arrays ([] on failure)"""
+        try:
+            return self.process_request(input_data, model_name)
+        except PreprocessError as e:
+            request_log.warning(f"✗ Bad input: {e}")
+        except Exception as e:
+            request_log.error(f"✗ Inference error: {e}")
+        return []
+    
+    def admit(self, client_address, meta):
+        """Admission check before any work: None if admitted, else the busy reply"""
+        if self.admission is None:
+            return None
+        client = client_address[0] if isinstance(client_address, tuple) else client_address
+        rejection = self.admission.admit(client, meta.get('priority', 'normal'))
+        if rejection is None:
+            return None
+        reason, retry_after = rejection
+        REJECTED.labels(reason).inc()
+        busy = {'error': 'server busy', 'reason': reason}
+        if retry_after:
+            busy['retry_after_ms'] = round(retry_after * 1000, 1)
+        return STATUS_BUSY, [], busy
+    
+    def run_admitted(self, func, *args):
+        """Run an admitted request, handing its admission slot back afterwards"""
+        try:
+            return func(*args)
+        finally:
+            if self.admission is not None:
+                self.admission.release()
+    
+    def request_deadline(self, frame, disconnected=None):
+        """The Deadline for a received request: its deadline_ms counted from arrival, and the
+        connection's disconnect event"""
+        start = time.monotonic() - frame.recv_seconds
+        return Deadline.from_meta(frame.meta, disconnected, start)
+    
+    def hello(self, offer):
+        """Answer a client's MSG_HELLO: the compression and output dtype we will use"""
+        dtypes = offer.get('output_dtypes') or []
+        return {'compression': choose(offer.get('compression'), available_compressions()),
+                'output_dtype': choose(dtypes, OUTPUT_DTYPES),
+                'compressions': available_compressions(),
+                'output_dtypes': list(OUTPUT_DTYPES)}
+    
+    def handle_request(self, payload, meta, deadline=None):
+        """Serve one framed request; returns (status, outputs, response metadata)"""
+        model_name = meta.get('model')
+        if model_name is not None and model_name not in self.registry:
+            return STATUS_ERROR, [], {'error': f"unknown model '{model_name}'"}
+        
+        try:
+            if meta.get('compression'):
+                payload = decompress(meta['compression'], payload, MAX_PAYLOAD_SIZE)
+            results = self.process_request(payload, model_name, use_cache=meta.get('cache', True),
+                                           deadline=deadline)
+        except Cancelled as e:
+            return STATUS_EXPIRED, [], {'error': str(e)}
+        except (CodecError, PreprocessError) as e:
+            return STATUS_ERROR, [], {'error': str(e)}
+        except Exception as e:
+            request_log.error(f"✗ Inference error: {e}")
+            results = []
+        if not results:
+            return STATUS_ERROR, [], {'error': 'inference failed'}
+        
+        if not (meta.get('output_dtype') or meta.get('accept_compression')):
+            return STATUS_OK, results, None
+        try:
+            results, response_meta = encode_outputs(results, meta.get('output_dtype') or 'float32')
+            if meta.get('accept_compression'):
+                results = [compress(meta['accept_compression'], results)]
+                response_meta['compression'] = meta['accept_compression']
+        except CodecError as e:
+            return STATUS_ERROR, [], {'error': str(e)}
+        return STATUS_OK, results, response_meta
+    
+    def record_response(self, mode, client_address, status, received, sent, recv_seconds, send_seconds):
+        """Account one answered request in the metrics and the request log"""
+        status_name = STATUS_NAMES.get(status, 'error')
+        REQUESTS.labels(mode, status_name).inc()
+        BYTES_RECEIVED.inc(received)
+        BYTES_SENT.inc(sent)
+        RECEIVE_SECONDS.observe(recv_seconds)
+        SEND_SECONDS.observe(send_seconds)
+        if request_log.isEnabledFor(logging.INFO):
+            request_log.info("📤 Response sent", extra=fields(
+                mode=mode, client=client_address, status=status_name,
+                bytes_in=received, bytes_out=sent))
     
     def handle_client(self, client_socket, client_address):
         """Handle client connection"""
-        print(f"🔗 New client: {client_address}")
+        request_log.debug("🔗 New client", extra=fields(client=client_address))
+        CONNECTIONS.inc()
         
         try:
-            # Receive data size
-            size_data = client_socket.recv(4)
-            if len(size_data) < 4:
-                print("Failed to receive data size")
+            # Receive data size (or the framed-mode preamble)
+            size_data = recv_exact(client_socket, 4)
+            if size_data is None:
+                request_log.debug("Failed to receive data size", extra=fields(client=client_address))
+                return
+            
+            if size_data == MAGIC:
+                self.serve_framed(client_socket, client_address)
                 return
             
             data_size = int.from_bytes(size_data, byteorder='little')
-            print(f"📥 Expecting {data_size} bytes")
+            if data_size > MAX_PAYLOAD_SIZE:
+                request_log.warning("✗ Refusing oversized request",
+                                    extra=fields(client=client_address, bytes=data_size))
+                return
             
-            # Receive input data
-            input_data = b''
-            while len(input_data) < data_size:
-                chunk = client_socket.recv(min(8192, data_size - len(input_data)))
-                if not chunk:
-                    print("Client disconnected during transfer")
+            # Receive input data straight into a pooled buffer - no per-chunk copies
+            buffer = self.buffers.acquire(data_size)
+            try:
+                recv_start = time.perf_counter()
+                input_data = memoryview(buffer)[:data_size]
+                if not recv_into_exact(client_socket, input_data):
+                    request_log.debug("Client disconnected during transfer", extra=fields(client=client_address))
                     return
-                input_data += chunk
+                recv_seconds = time.perf_counter() - recv_start
                 
-                # Show progress for large transfers
-                if len(input_data) % 10000 == 0:
-                    progress = (len(input_data) / data_size) * 100
-                    print(f"📥 Progress: {progress:.1f}%")
+                # Run inference - legacy replies carry no status, so a busy
+                # server answers with an empty result like a failed one
+                busy = self.admit(client_address, {})
+                results = [] if busy else self.run_admitted(self.run_inference, input_data)
+            finally:
+                # The input array aliases the buffer; inference is done with it now
+                self.buffers.release(buffer)
             
-            print(f"✓ Received {len(input_data)} bytes")
+            # Result size and the output arrays in one scatter-gather write
+            # (an empty result tells the client inference failed)
+            send_start = time.perf_counter()
+            result_size = payload_size(results)
+            send_buffers(client_socket, [SIZE_HEADER.pack(result_size)] + results)
+            status = busy[0] if busy else STATUS_OK if results else STATUS_ERROR
+            self.record_response('legacy', client_address, status,
+                                 data_size + 4, result_size + 4,
+                                 recv_seconds, time.perf_counter() - send_start)
             
-            # Run inference
-            print("🧠 Running NPU inference...")
-            results = self.run_inference(input_data)
+        except Exception as e:
+            request_log.warning(f"✗ Error with client: {e}", extra=fields(client=client_address))
+        finally:
+            client_socket.close()
+            CONNECTIONS.dec()
+            request_log.debug("🔌 Client disconnected", extra=fields(client=client_address))
+    
+    def serve_framed(self, client_socket, client_address):
+        """Serve many requests over one persistent framed connection"""
+        try:
+            version = server_handshake(client_socket)
+        except ProtocolError as e:
+            request_log.warning(f"✗ Handshake failed: {e}", extra=fields(client=client_address))
+            return
+        
+        # Replies are small and latency bound - don't let Nagle hold them back
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request_log.debug("🔗 Framed protocol", extra=fields(client=client_address, version=version))
+        
+        # Three stages: this thread receives, the stage pool preprocesses and waits on
+        # the NPU, and a sender thread answers in arrival order - so while one request
+        # is on the NPU the next is already arriving and the previous is going out.
+        # The bounded queue stops reading once pipeline_depth requests are in flight.
+        pending = queue.Queue(maxsize=self.pipeline_depth)
+        served = 0
+        # Set when the client goes away - a reset or a failed send, not a half-close by a
+        # client still reading - so requests it left queued are dropped unrun
+        disconnected = threading.Event()
+        
+        def send_stage():
+            nonlocal served
+            broken = False
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                frame, future = item
+                try:
+                    status, results, meta = future.result()
+                except Exception as e:
+                    status, results, meta = STATUS_ERROR, [], {'error': str(e)}
+                finally:
+                    self.release_frame(frame)
+                if broken:
+                    continue
+                
+                reply_type = MSG_HELLO if frame.msg_type == MSG_HELLO else MSG_RESPONSE
+                send_start = time.perf_counter()
+                try:
+                    write_frame(client_socket, reply_type, frame.request_id, results, status=status, meta=meta)
+                except OSError as e:
+                    # Keep draining so every pooled buffer comes back; unblock the reader
+                    request_log.warning(f"✗ Send failed: {e}", extra=fields(client=client_address))
+                    broken = True
+                    disconnected.set()
+                    try:
+                        client_socket.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    continue
+                if reply_type == MSG_RESPONSE:
+                    self.record_response('framed', client_address, status,
+                                         len(frame.payload), payload_size(results),
+                                         frame.recv_seconds, time.perf_counter() - send_start)
+                    served += 1
+        
+        sender = threading.Thread(target=send_stage, name='npu-send', daemon=True)
+        sender.start()
+        stream_frame = None
+        try:
+            while True:
+                try:
+                    frame = read_frame(client_socket, self.buffers)
+                except OSError as e:
+                    request_log.warning(f"✗ Connection lost: {e}", extra=fields(client=client_address))
+                    disconnected.set()
+                    break
+                except ProtocolError as e:
+                    request_log.warning(f"✗ Protocol error: {e}", extra=fields(client=client_address))
+                    break
+                if frame is None:
+                    break
+                if frame.msg_type == MSG_STREAM_FRAME:
+                    stream_frame = frame
+                    break
+                
+                if frame.msg_type == MSG_REQUEST:
+                    reply = self.admit(client_address, frame.meta)
+                else:
+                    reply = self.reply_for(frame)
+                if reply is None:
+                    deadline = self.request_deadline(frame, disconnected)
+                    future = self.stages.submit(self.run_admitted, self.handle_request,
+                                                frame.payload, frame.meta, deadline)
+                else:
+                    future = Future()
+                    future.set_result(reply)
+                pending.put((frame, future))
+        finally:
+            # Everything already received is answered (or dropped, once the client is gone)
+            # before the connection moves on
+            pending.put(None)
+            sender.join()
+        
+        if stream_frame is not None:
+            served += self.serve_stream(client_socket, client_address, stream_frame)
+        request_log.debug("✓ Persistent connection closed", extra=fields(client=client_address, served=served))
+    
+    def reply_for(self, frame):
+        """The answer to a framed message that is not an inference request"""
+        if frame.msg_type == MSG_HELLO:
+            return STATUS_OK, [], self.hello(frame.meta)
+        return STATUS_ERROR, [], {'error': f"unexpected message type {frame.msg_type}"}
+    
+    def release_frame(self, frame):
+        if frame.buffer is not None:
+            self.buffers.release(frame.buffer)
+    
+    def stream_session(self, send):
+        """A StreamSession running this server's inference; send(frame_id, status, results, meta)"""
+        def send_result(frame_id, status, results, meta):
+            send(frame_id, status, results, meta)
+            REQUESTS.labels('stream', STATUS_NAMES.get(status, 'error')).inc()
+            BYTES_SENT.inc(payload_size(results))
+        
+        return StreamSession(lambda frame: self.handle_request(frame.payload, frame.meta),
+                             send_result, self.release_frame)
+    
+    def serve_stream(self, client_socket, client_address, frame):
+        """Latest-frame streaming for the rest of a framed connection; returns frames inferred"""
+        def send(frame_id, status, results, meta):
+            write_frame(client_socket, MSG_STREAM_RESULT, frame_id, results, status=status, meta=meta)
+        
+        request_log.debug("🎥 Stream started", extra=fields(client=client_address))
+        session = self.stream_session(send)
+        try:
+            while frame is not None:
+                BYTES_RECEIVED.inc(len(frame.payload))
+                if frame.msg_type != MSG_STREAM_FRAME:
+                    self.release_frame(frame)
+                elif not session.push(frame):
+                    STREAM_DROPPED.inc()
+                frame = read_frame(client_socket, self.buffers)
+        except (OSError, ProtocolError) as e:
+            request_log.warning(f"✗ Stream error: {e}", extra=fields(client=client_address))
+        finally:
+            session.close()
+        request_log.debug("🎥 Stream ended", extra=fields(
+            client=client_address, received=session.received, dropped=session.dropped))
+        return session.completed
+    
+    def serve_shm(self, conn):
+        """Serve a co-located client whose tensors live in a shared memory segment (see npu_shm.py)"""
+        CONNECTIONS.inc()
+        segment = None
+        try:
+            if recv_exact(conn, len(MAGIC)) != MAGIC:
+                return
+            server_handshake(conn)
+            hello = read_frame(conn)
+            if hello is None or hello.msg_type != MSG_HELLO or 'shm' not in hello.meta:
+                raise ProtocolError("Expected a shared memory hello")
+            segment = AttachedSegment(hello.meta['shm'], owner_uid=peer_uid(conn))
+            slots, slot_size = int(hello.meta['slots']), int(hello.meta['slot_size'])
+            if slots * slot_size > segment.size:
+                raise ProtocolError(f"{slots} x {slot_size} byte slots exceed the segment")
+            write_frame(conn, MSG_HELLO, hello.request_id, meta={'shm': segment.name})
+            request_log.debug("🔗 Shared memory client", extra=fields(segment=segment.name, slots=slots))
             
-            if results:
-                # Send result size
-                result_size = len(results)
-                client_socket.send(result_size.to_bytes(4, byteorder='little'))
+            while True:
+                frame = read_frame(conn)
+                if frame is None:
+                    break
+                slot, size = frame.meta.get('slot'), frame.meta.get('size')
+                valid = (isinstance(slot, int) and isinstance(size, int)
+                         and slot in range(slots) and size in range(slot_size + 1))
+                if frame.msg_type != MSG_REQUEST or not valid:
+                    write_frame(conn, MSG_RESPONSE, frame.request_id, status=STATUS_ERROR,
+                                meta={'error': "expected a request naming a slot and size"})
+                    continue
                 
-                # Send results
-                client_socket.send(results)
-                print(f"📤 Sent {result_size} bytes back to client")
-            else:
-                # Send empty result
-                client_socket.send((0).to_bytes(4, byteorder='little'))
-                print("📤 Sent empty result (inference failed)")
+                # Inputs are read from, and outputs written back to, the client's slot
+                view = segment.buf[slot * slot_size:(slot + 1) * slot_size]
+                status, results, meta = (self.admit('local', frame.meta)
+                                         or self.run_admitted(self.handle_request, view[:size], frame.meta,
+                                                              self.request_deadline(frame)))
+                send_start = time.perf_counter()
+                result_size = payload_size(results)
+                if result_size > slot_size:
+                    status, meta = STATUS_ERROR, {'error': f"{result_size} byte result exceeds the slot"}
+                    result_size = 0
+                elif status == STATUS_OK:
+                    offset = 0
+                    for result in results:
+                        data = memoryview(result).cast('B')
+                        view[offset:offset + len(data)] = data
+                        offset += len(data)
+                write_frame(conn, MSG_RESPONSE, frame.request_id, status=status,
+                            meta=dict(meta or {}, slot=slot, size=result_size))
+                self.record_response('shm', 'local', status, size, result_size,
+                                     frame.recv_seconds, time.perf_counter() - send_start)
                 
-        except Exception as e:
-            print(f"✗ Error with client {client_address}: {e}")
+        except (OSError, ValueError, KeyError, ProtocolError) as e:
+            request_log.warning(f"✗ Shared memory client error: {e}")
         finally:
-            client_socket.close()
-            print(f"🔌 Client {client_address} disconnected")
+            if segment is not None:
+                segment.close()
+            conn.close()
+            CONNECTIONS.dec()
     
-    def start_server(self, host='0.0.0.0', port=8080):
-        """Start the server"""
+    def start_server(self, host='0.0.0.0', port=8080, backlog=128):
+        """Start the server (one thread per connection)"""
         print(f"🚀 Starting RK3588 NPU Server...")
         print(f"📍 Host: {host}:{port}")
         print(f"🧠 NPU Available: {RKNN_AVAILABLE}")
@@ -177,9 +734,10 @@ class SimpleRK3588Server:
         
         try:
             server_socket.bind((host, port))
-            server_socket.listen(5)
+            server_socket.listen(backlog)
             
             print(f"✅ Server listening on {host}:{port}")
+            self.mark_ready()
             print("🔄 Waiting for clients...")
             print("Press Ctrl+C to stop")
             
@@ -199,15 +757,258 @@ class SimpleRK3588Server:
                     print("\n🛑 Shutting down server...")
                     break
                 except Exception as e:
-                    print(f"Accept error: {e}")
+                    log.warning(f"Accept error: {e}")
                     
         except Exception as e:
             print(f"✗ Server error: {e}")
         finally:
             server_socket.close()
-            if self.rknn:
-                self.rknn.release()
+            self.shutdown()
+            print("✅ Server stopped")
+    
+    def shutdown(self):
+        """Finish queued NPU work and release the runtimes"""
+        self.stages.shutdown(wait=False, cancel_futures=True)
+        self.registry.close()
+    
+    def start_async_server(self, host='0.0.0.0', port=8080, backlog=128,
+                           max_connections=256, max_inflight=32):
+        """Start the server on an asyncio event loop instead of a thread per connection"""
+        print("🚀 Starting RK3588 NPU Server (asyncio)...")
+        print(f"📍 Host: {host}:{port}")
+        print(f"🧠 NPU Available: {RKNN_AVAILABLE}")
+        print(f"📦 Model Loaded: {self.model_loaded}")
+        print(f"🚦 Limits: {max_connections} connections, {max_inflight} requests in flight, backlog {backlog}")
+        
+        try:
+            asyncio.run(self._serve_async(host, port, backlog, max_connections, max_inflight))
+        except KeyboardInterrupt:
+            print("\n🛑 Shutting down server...")
+        except Exception as e:
+            print(f"✗ Server error: {e}")
+        finally:
+            self.shutdown()
             print("✅ Server stopped")
+    
+    async def _serve_async(self, host, port, backlog, max_connections, max_inflight):
+        loop = asyncio.get_running_loop()
+        
+        # Blocking NPU waits run on a fixed set of threads; the semaphore keeps
+        # requests from piling up in the executor's queue, so a saturated NPU
+        # stops us reading further requests and TCP pushes back on the clients
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix='npu-wait')
+        self._inflight = asyncio.Semaphore(max_inflight)
+        connection_slots = asyncio.Semaphore(max_connections)
+        tasks = set()
+        
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server_socket.bind((host, port))
+            server_socket.listen(backlog)
+            server_socket.setblocking(False)
+            
+            print(f"✅ Server listening on {host}:{port}")
+            self.mark_ready()
+            print("🔄 Waiting for clients...")
+            print("Press Ctrl+C to stop")
+            
+            while True:
+                # At the connection limit, new clients wait in the listen backlog
+                await connection_slots.acquire()
+                try:
+                    client_socket, client_address = await loop.sock_accept(server_socket)
+                except OSError as e:
+                    connection_slots.release()
+                    log.warning(f"Accept error: {e}")
+                    continue
+                
+                client_socket.setblocking(False)
+                task = loop.create_task(self._async_handle_client(client_socket, client_address))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: connection_slots.release())
+        finally:
+            server_socket.close()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _async_call(self, func, *args):
+        """Run a blocking serving call on the executor, holding one in-flight slot"""
+        async with self._inflight:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+    
+    async def _async_serve_stream(self, loop, client_socket, client_address, frame):
+        """Latest-frame streaming (asyncio); inference runs on the session's own thread"""
+        def send(frame_id, status, results, meta):
+            asyncio.run_coroutine_threadsafe(
+                async_write_frame(loop, client_socket, MSG_STREAM_RESULT, frame_id, results,
+                                  status=status, meta=meta), loop).result()
+        
+        request_log.debug("🎥 Stream started", extra=fields(client=client_address))
+        session = self.stream_session(send)
+        try:
+            while frame is not None:
+                BYTES_RECEIVED.inc(len(frame.payload))
+                if frame.msg_type != MSG_STREAM_FRAME:
+                    self.release_frame(frame)
+                elif not session.push(frame):
+                    STREAM_DROPPED.inc()
+                frame = await async_read_frame(loop, client_socket, self.buffers)
+        except (OSError, ProtocolError) as e:
+            request_log.warning(f"✗ Stream error: {e}", extra=fields(client=client_address))
+        finally:
+            # Joining the session waits for its last send, which needs this loop running
+            await loop.run_in_executor(None, session.close)
+        request_log.debug("🎥 Stream ended", extra=fields(
+            client=client_address, received=session.received, dropped=session.dropped))
+        return session.completed
+    
+    async def _async_handle_client(self, client_socket, client_address):
+        """Handle client connection (asyncio, same wire protocol as handle_client)"""
+        request_log.debug("🔗 New client", extra=fields(client=client_address))
+        CONNECTIONS.inc()
+        loop = asyncio.get_running_loop()
+        
+        try:
+            size_data = await async_recv_exact(loop, client_socket, 4)
+            if size_data is None:
+                request_log.debug("Failed to receive data size", extra=fields(client=client_address))
+                return
+            
+            if size_data == MAGIC:
+                await self._async_serve_framed(loop, client_socket, client_address)
+                return
+            
+            data_size = int.from_bytes(size_data, byteorder='little')
+            if data_size > MAX_PAYLOAD_SIZE:
+                request_log.warning("✗ Refusing oversized request",
+                                    extra=fields(client=client_address, bytes=data_size))
+                return
+            
+            buffer = self.buffers.acquire(data_size)
+            try:
+                recv_start = time.perf_counter()
+                input_data = memoryview(buffer)[:data_size]
+                if not await async_recv_into_exact(loop, client_socket, input_data):
+                    request_log.debug("Client disconnected during transfer", extra=fields(client=client_address))
+                    return
+                recv_seconds = time.perf_counter() - recv_start
+                
+                busy = self.admit(client_address, {})
+                if busy:
+                    results = []
+                else:
+                    results = await self._async_call(self.run_admitted, self.run_inference, input_data)
+            finally:
+                self.buffers.release(buffer)
+            
+            send_start = time.perf_counter()
+            result_size = payload_size(results)
+            await async_send_buffers(loop, client_socket, [SIZE_HEADER.pack(result_size)] + results)
+            status = busy[0] if busy else STATUS_OK if results else STATUS_ERROR
+            self.record_response('legacy', client_address, status,
+                                 data_size + 4, result_size + 4,
+                                 recv_seconds, time.perf_counter() - send_start)
+            
+        except Exception as e:
+            request_log.warning(f"✗ Error with client: {e}", extra=fields(client=client_address))
+        finally:
+            client_socket.close()
+            CONNECTIONS.dec()
+            request_log.debug("🔌 Client disconnected", extra=fields(client=client_address))
+    
+    async def _async_serve_framed(self, loop, client_socket, client_address):
+        """Serve many requests over one persistent framed connection (asyncio)"""
+        try:
+            version = await async_server_handshake(loop, client_socket)
+        except ProtocolError as e:
+            request_log.warning(f"✗ Handshake failed: {e}", extra=fields(client=client_address))
+            return
+        
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        request_log.debug("🔗 Framed protocol", extra=fields(client=client_address, version=version))
+        
+        # Same receive / infer / send stages as serve_framed, as tasks on the loop
+        pending = asyncio.Queue(maxsize=self.pipeline_depth)
+        served = 0
+        disconnected = threading.Event()
+        
+        async def send_stage():
+            nonlocal served
+            broken = False
+            while True:
+                item = await pending.get()
+                if item is None:
+                    break
+                frame, task = item
+                try:
+                    status, results, meta = await task
+                except Exception as e:
+                    status, results, meta = STATUS_ERROR, [], {'error': str(e)}
+                finally:
+                    self.release_frame(frame)
+                if broken:
+                    continue
+                
+                reply_type = MSG_HELLO if frame.msg_type == MSG_HELLO else MSG_RESPONSE
+                send_start = time.perf_counter()
+                try:
+                    await async_write_frame(loop, client_socket, reply_type, frame.request_id, results,
+                                            status=status, meta=meta)
+                except OSError as e:
+                    request_log.warning(f"✗ Send failed: {e}", extra=fields(client=client_address))
+                    broken = True
+                    disconnected.set()
+                    try:
+                        client_socket.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    continue
+                if reply_type == MSG_RESPONSE:
+                    self.record_response('framed', client_address, status,
+                                         len(frame.payload), payload_size(results),
+                                         frame.recv_seconds, time.perf_counter() - send_start)
+                    served += 1
+        
+        sender = loop.create_task(send_stage())
+        stream_frame = None
+        try:
+            while True:
+                try:
+                    frame = await async_read_frame(loop, client_socket, self.buffers)
+                except OSError as e:
+                    request_log.warning(f"✗ Connection lost: {e}", extra=fields(client=client_address))
+                    disconnected.set()
+                    break
+                except ProtocolError as e:
+                    request_log.warning(f"✗ Protocol error: {e}", extra=fields(client=client_address))
+                    break
+                if frame is None:
+                    break
+                if frame.msg_type == MSG_STREAM_FRAME:
+                    stream_frame = frame
+                    break
+                
+                if frame.msg_type == MSG_REQUEST:
+                    reply = self.admit(client_address, frame.meta)
+                else:
+                    reply = self.reply_for(frame)
+                if reply is None:
+                    deadline = self.request_deadline(frame, disconnected)
+                    task = loop.create_task(self._async_call(self.run_admitted, self.handle_request,
+                                                             frame.payload, frame.meta, deadline))
+                else:
+                    task = loop.create_future()
+                    task.set_result(reply)
+                await pending.put((frame, task))
+        finally:
+            await pending.put(None)
+            await sender
+        
+        if stream_frame is not None:
+            served += await self._async_serve_stream(loop, client_socket, client_address, stream_frame)
+        request_log.debug("✓ Persistent connection closed", extra=fields(client=client_address, served=served))
 
 def test_npu_setup():
     """Test NPU hardware setup"""
@@ -241,6 +1042,77 @@ def test_npu_setup():
         print("? NPU version not available")
 
 def main():
+    parser = argparse.ArgumentParser(description="RK3588 NPU inference server")
+    parser.add_argument('model', nargs='?', help="RKNN model file (omit for test mode)")
+    parser.add_argument('port', nargs='?', type=int, default=8080)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="batch the model was converted with (rknn_batch_size); >1 enables dynamic batching")
+    parser.add_argument('--batch-wait-ms', type=float, default=2.0,
+                        help="longest a request waits for a batch to fill")
+    parser.add_argument('--cores', default='0,1,2',
+                        help="NPU cores to run a model runtime on, e.g. '0,1,2' (one runtime per core) "
+                             "or '0_1_2' (one runtime spanning all three)")
+    parser.add_argument('--model', dest='models', action='append', default=[], metavar='NAME=PATH',
+                        help="extra model clients can select by name (repeatable; loaded on first use)")
+    parser.add_argument('--model-dir', help="register every *.rknn in this directory by file name")
+    parser.add_argument('--input-spec', dest='input_specs', action='append', default=[],
+                        metavar='[NAME=]HxWxC',
+                        help="model input tensor, e.g. 224x224x3 or yolov5=640x640x3 (repeatable); "
+                             "a NAME.json next to the model can also give layout, dtype, mean and std")
+    parser.add_argument('--cache-mb', type=int, default=0,
+                        help="cache results of repeated inputs in this much memory (0 disables)")
+    parser.add_argument('--cache-ttl', type=float, help="seconds a cached result stays valid")
+    parser.add_argument('--npu-memory-mb', type=int, default=1024,
+                        help="memory budget for loaded models; idle models are evicted LRU beyond it")
+    parser.add_argument('--pipeline-depth', type=int, default=4,
+                        help="requests one framed connection may have in flight between receive and send")
+    parser.add_argument('--warmup', type=int, default=1, metavar='N',
+                        help="inferences run on every NPU runtime before accepting clients (0 to skip)")
+    parser.add_argument('--preload', action='append', default=[], metavar='NAME',
+                        help="also load and warm up this model at start-up (repeatable)")
+    parser.add_argument('--max-pending', type=int,
+                        help="requests admitted but not yet answered before new ones are rejected as busy "
+                             "(normal priority sheds at 80%%, low at 50%%)")
+    parser.add_argument('--client-rate', type=float, help="requests per second allowed per client host")
+    parser.add_argument('--client-burst', type=float, help="token bucket size per client (default: --client-rate)")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on this port (http://HOST:PORT/metrics)")
+    parser.add_argument('--metrics-host', default='127.0.0.1', help="address for the metrics endpoint")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="DEBUG adds per-connection and per-batch detail")
+    parser.add_argument('--log-sample', type=int, default=1, metavar='N',
+                        help="log only one in N per-request lines (warnings are always kept)")
+    parser.add_argument('--log-file', help="write the log here instead of stdout")
+    parser.add_argument('--shm-socket', nargs='?', const=DEFAULT_SOCKET,
+                        help=f"also serve co-located clients over shared memory on this Unix socket "
+                             f"(default {DEFAULT_SOCKET})")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="serve on an asyncio event loop instead of a thread per connection")
+    parser.add_argument('--backlog', type=int, default=128, help="listen backlog")
+    parser.add_argument('--max-connections', type=int, default=256,
+                        help="(--async) concurrent connections before new ones wait in the backlog")
+    parser.add_argument('--max-inflight', type=int, default=32,
+                        help="(--async) requests waiting on the NPU before reading from clients pauses")
+    args = parser.parse_args()
+    
+    models = {}
+    for spec in args.models:
+        name, sep, path = spec.partition('=')
+        if not sep:
+            parser.error(f"--model expects NAME=PATH, got '{spec}'")
+        models[name] = path
+    
+    input_specs = {}
+    for spec in args.input_specs:
+        name, sep, dims = spec.rpartition('=')
+        try:
+            input_specs[name or None] = InputSpec.parse(dims)
+        except ValueError as e:
+            parser.error(f"--input-spec: {e}")
+    
+    setup_logging(args.log_level, sample_every=args.log_sample, path=args.log_file)
+    
     print("=" * 50)
     print("🍊 Orange Pi 5 NPU Server Test")
     print("=" * 50)
@@ -249,22 +1121,44 @@ def main():
     test_npu_setup()
     print()
     
-    if len(sys.argv) < 2:
-        print("Usage: python3 simple_rk3588_test.py [model.rknn] [port]")
+    if not args.model:
+        print("Usage: python3 rk3588NPU_server.py [model.rknn] [port]")
         print("Running in test mode without model...")
-        model_path = None
-    else:
-        model_path = sys.argv[1]
     
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    if args.metrics_port:
+        start_metrics_server(args.metrics_host, args.metrics_port)
+        print(f"📈 Metrics on http://{args.metrics_host}:{args.metrics_port}/metrics")
     
+    shm_listener = None
     try:
-        server = SimpleRK3588Server(model_path)
-        server.start_server(port=port)
+        server = SimpleRK3588Server(args.model, batch_size=args.batch_size,
+                                    batch_wait_ms=args.batch_wait_ms,
+                                    core_masks=parse_core_masks(args.cores),
+                                    models=models,
+                                    model_dir=args.model_dir, npu_memory_mb=args.npu_memory_mb,
+                                    input_specs=input_specs,
+                                    cache_mb=args.cache_mb, cache_ttl=args.cache_ttl,
+                                    pipeline_depth=args.pipeline_depth,
+                                    warmup_runs=args.warmup, preload=args.preload,
+                                    max_pending=args.max_pending, client_rate=args.client_rate,
+                                    client_burst=args.client_burst)
+        if args.shm_socket:
+            shm_listener = ShmListener(args.shm_socket, server.serve_shm)
+            print(f"🧩 Shared memory transport on {args.shm_socket}")
+        if args.use_async:
+            server.start_async_server(host=args.host, port=args.port, backlog=args.backlog,
+                                      max_connections=args.max_connections,
+                                      max_inflight=args.max_inflight)
+        else:
+            server.start_server(host=args.host, port=args.port, backlog=args.backlog)
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
     except Exception as e:
         print(f"✗ Fatal error: {e}")
+    finally:
+        if shm_listener is not None:
+            shm_listener.close()
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# test_npu_codec.py - Decompression limits in npu_codec.py (run with: python3 -m pytest test_npu_codec.py)
+import io
+
+import pytest
+
+from npu_codec import CodecError, decompress
+
+zstandard = pytest.importorskip('zstandard')
+
+LIMIT = 1024 * 1024
+
+
+def test_zstd_round_trip():
+    data = b'abc' * 1000
+    assert decompress('zstd', zstandard.ZstdCompressor(level=1).compress(data), LIMIT) == data
+
+
+def test_zstd_bomb_with_content_size_is_rejected():
+    """A frame declaring 10 MB of content is refused under a 1 MB limit"""
+    bomb = zstandard.ZstdCompressor(level=1).compress(bytes(10 * LIMIT))
+    assert zstandard.frame_content_size(bomb) == 10 * LIMIT
+    with pytest.raises(CodecError, match='exceeds'):
+        decompress('zstd', bomb, LIMIT)
+
+
+def test_zstd_bomb_without_content_size_is_rejected():
+    buffer = io.BytesIO()
+    with zstandard.ZstdCompressor(level=1).stream_writer(buffer, closefd=False) as writer:
+        writer.write(bytes(10 * LIMIT))
+    bomb = buffer.getvalue()
+    assert zstandard.frame_content_size(bomb) == -1
+    with pytest.raises(CodecError, match='exceeds'):
+        decompress('zstd', bomb, LIMIT)
+    assert len(decompress('zstd', bomb, 10 * LIMIT)) == 10 * LIMIT
+
+
+def test_zstd_truncated_frame_is_rejected():
+    payload = zstandard.ZstdCompressor(level=1).compress(b'abc' * 1000)
+    with pytest.raises(CodecError):
+        decompress('zstd', payload[:-5], LIMIT)
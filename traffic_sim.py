@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# traffic_sim.py - Discrete-event simulation of distcc and inference traffic through switch, SAN and nodes
+"""
+The analytic models (net_band*.py, ESX_nodes.py, capacity_model.py) give
+steady-state averages.  This simulator follows individual compile jobs or
+inference requests through FIFO queues in front of the switch, the SAN and
+the worker nodes, so it reports what the averages hide: queueing delay and
+tail latency as a shared link approaches saturation.
+
+A distcc job holds a node slot while it reads sources from the SAN, sends
+the preprocessed source over the switch, compiles, returns the object over
+the switch and writes it to the SAN.  An inference request crosses the
+switch, waits for an NPU core and sends its result back.  Transfer sizes
+default to the per-node Mbps figures of net_band10G.py spread over one
+job's compile time, so a fully busy node offers the same load the analytic
+model assumes.
+"""
+import argparse
+import heapq
+import json
+import math
+import random
+from collections import deque
+
+import numpy as np
+
+
+class Simulator:
+    """Event loop: a heap of (time, sequence, callback, args)"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._events = []
+        self._sequence = 0
+
+    def schedule(self, delay, callback, *args):
+        self._sequence += 1
+        heapq.heappush(self._events, (self.now + delay, self._sequence, callback, args))
+
+    def run(self, until=math.inf):
+        while self._events and self._events[0][0] <= until:
+            self.now, _, callback, args = heapq.heappop(self._events)
+            callback(*args)
+
+
+class Resource:
+    """servers identical servers in front of one FIFO queue; records waits and busy time"""
+
+    def __init__(self, sim, name, servers=1):
+        self.sim = sim
+        self.name = name
+        self.servers = servers
+        self.busy = 0
+        self.busy_time = 0.0
+        self.waits = []
+        self._queue = deque()
+        self._changed_at = 0.0
+
+    def _account(self):
+        self.busy_time += self.busy * (self.sim.now - self._changed_at)
+        self._changed_at = self.sim.now
+
+    def acquire(self, callback, *args):
+        """Call callback(*args) once a server is free; pair with release()"""
+        if self.busy < self.servers:
+            self._account()
+            self.busy += 1
+            self.waits.append(0.0)
+            callback(*args)
+        else:
+            self._queue.append((self.sim.now, callback, args))
+
+    def release(self):
+        if self._queue:
+            queued_at, callback, args = self._queue.popleft()
+            self.waits.append(self.sim.now - queued_at)
+            callback(*args)
+        else:
+            self._account()
+            self.busy -= 1
+
+    def use(self, duration, callback, *args):
+        """Hold a server for duration seconds, then call callback(*args)"""
+        def start():
+            self.sim.schedule(duration, finish)
+
+        def finish():
+            self.release()
+            callback(*args)
+
+        self.acquire(start)
+
+    def utilization(self, elapsed):
+        self._account()
+        return self.busy_time / (self.servers * elapsed) if elapsed > 0 else 0.0
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+
+def transfer_seconds(megabytes, mbps):
+    return megabytes * 8 / mbps
+
+
+class Workload:
+    """Open-loop Poisson arrivals of jobs through a set of resources; subclasses define job()"""
+
+    def __init__(self, rate, seed=None):
+        self.rate = rate
+        self.random = random.Random(seed)
+        self.sim = Simulator()
+        self.resources = {}
+        self.latencies = []  # (arrival time, seconds) per completed job
+        self.started = 0
+
+    def resource(self, name, servers=1):
+        self.resources[name] = Resource(self.sim, name, servers)
+        return self.resources[name]
+
+    def _arrive(self):
+        self.started += 1
+        self.job(self.sim.now)
+        self.sim.schedule(self.random.expovariate(self.rate), self._arrive)
+
+    def done(self, arrived_at):
+        self.latencies.append((arrived_at, self.sim.now - arrived_at))
+
+    def run(self, duration, warmup=0.0):
+        """Simulate warmup + duration seconds; returns the statistics of jobs arriving after warmup"""
+        self.sim.schedule(self.random.expovariate(self.rate), self._arrive)
+        self.sim.run(until=warmup + duration)
+        return self.report(duration, warmup)
+
+    def report(self, duration, warmup):
+        latencies = np.array([seconds for arrived_at, seconds in self.latencies if arrived_at >= warmup])
+        stats = {
+            'offered_rate': self.rate,
+            'completed': int(latencies.size),
+            'throughput': latencies.size / duration if duration else 0.0,
+            'backlog': self.started - len(self.latencies),
+        }
+        if latencies.size:
+            stats['latency_ms'] = {
+                'mean': float(latencies.mean() * 1000),
+                'p50': float(np.percentile(latencies, 50) * 1000),
+                'p95': float(np.percentile(latencies, 95) * 1000),
+                'p99': float(np.percentile(latencies, 99) * 1000),
+                'p99.9': float(np.percentile(latencies, 99.9) * 1000),
+                'max': float(latencies.max() * 1000),
+            }
+        elapsed = self.sim.now
+        stats['resources'] = {}
+        for name, resource in self.resources.items():
+            waits = np.array(resource.waits) if resource.waits else np.zeros(1)
+            stats['resources'][name] = {
+                'utilization': resource.utilization(elapsed) * 100,
+                'wait_mean_ms': float(waits.mean() * 1000),
+                'wait_p99_ms': float(np.percentile(waits, 99) * 1000),
+                'queued': resource.depth,
+            }
+        return stats
+
+
+class DistccWorkload(Workload):
+    """Compile jobs over a switch (and optionally a SAN) onto nodes with a few compile slots each"""
+
+    def __init__(self, rate, nodes=8, slots=1, compile_seconds=1.0, cv=0.5, switch_gbps=2.5, nic_gbps=2.5,
+                 san_gbps=10.0, san=True, network_out_mbps=80, network_in_mbps=280, san_read_mbps=200,
+                 san_write_mbps=150, seed=None):
+        super().__init__(rate, seed)
+        self.compile_seconds = compile_seconds
+        # Lognormal compile times with the requested mean and coefficient of variation
+        self.sigma = math.sqrt(math.log(1 + cv * cv))
+        self.mu = math.log(compile_seconds) - self.sigma ** 2 / 2
+        # A job moves what a busy node would in one mean compile time, in MB
+        self.source_mb = network_out_mbps * compile_seconds / 8
+        self.object_mb = network_in_mbps * compile_seconds / 8
+        self.san_read_mb = san_read_mbps * compile_seconds / 8
+        self.san_write_mb = san_write_mbps * compile_seconds / 8
+        # The switch carries one transfer at a time at the slower of switch and NIC speed
+        self.network_mbps = min(switch_gbps, nic_gbps) * 1000
+        self.san_mbps = san_gbps * 1000
+        self.slots = self.resource('nodes', nodes * slots)
+        self.switch = self.resource('switch')
+        self.san = self.resource('san') if san else None
+
+    def job(self, arrived_at):
+        compile_time = self.random.lognormvariate(self.mu, self.sigma)
+        scale = compile_time / self.compile_seconds  # bigger translation units move more bytes
+        self.slots.acquire(self._read_sources, arrived_at, compile_time, scale)
+
+    def _read_sources(self, arrived_at, compile_time, scale):
+        if self.san is None:
+            self._send_source(arrived_at, compile_time, scale)
+        else:
+            self.san.use(transfer_seconds(self.san_read_mb * scale, self.san_mbps),
+                         self._send_source, arrived_at, compile_time, scale)
+
+    def _send_source(self, arrived_at, compile_time, scale):
+        self.switch.use(transfer_seconds(self.source_mb * scale, self.network_mbps),
+                        self._compile, arrived_at, compile_time, scale)
+
+    def _compile(self, arrived_at, compile_time, scale):
+        self.sim.schedule(compile_time, self._return_object, arrived_at, scale)
+
+    def _return_object(self, arrived_at, scale):
+        self.switch.use(transfer_seconds(self.object_mb * scale, self.network_mbps),
+                        self._write_object, arrived_at, scale)
+
+    def _write_object(self, arrived_at, scale):
+        if self.san is None:
+            self._finish(arrived_at)
+        else:
+            self.san.use(transfer_seconds(self.san_write_mb * scale, self.san_mbps), self._finish, arrived_at)
+
+    def _finish(self, arrived_at):
+        self.slots.release()
+        self.done(arrived_at)
+
+
+class InferenceWorkload(Workload):
+    """Inference requests to NPU boards: input over the switch, an NPU core, result back"""
+
+    def __init__(self, rate, boards=3, cores=3, npu_ms=20.0, cv=0.3, input_kb=150.0, output_kb=4.0,
+                 switch_gbps=2.5, nic_gbps=2.5, seed=None):
+        super().__init__(rate, seed)
+        self.npu_seconds = npu_ms / 1000
+        self.sigma = math.sqrt(math.log(1 + cv * cv))
+        self.mu = math.log(self.npu_seconds) - self.sigma ** 2 / 2
+        self.input_mb = input_kb / 1024
+        self.output_mb = output_kb / 1024
+        self.network_mbps = min(switch_gbps, nic_gbps) * 1000
+        self.switch = self.resource('switch')
+        self.npu = self.resource('npu', boards * cores)
+
+    def job(self, arrived_at):
+        self.switch.use(transfer_seconds(self.input_mb, self.network_mbps), self.npu.acquire, self._infer, arrived_at)
+
+    def _infer(self, arrived_at):
+        self.sim.schedule(self.random.lognormvariate(self.mu, self.sigma), self._respond, arrived_at)
+
+    def _respond(self, arrived_at):
+        self.npu.release()
+        self.switch.use(transfer_seconds(self.output_mb, self.network_mbps), self.done, arrived_at)
+
+
+def print_report(results):
+    """One row per offered load, then where the time went at the highest load"""
+    print("Rate/s | Done/s | Backlog |  Mean ms |   p50 ms |   p99 ms | p99.9 ms | " +
+          " | ".join(f"{name[:6]:>6s} %" for name in results[0]['resources']))
+    print("-" * (66 + 11 * len(results[0]['resources'])))
+    for stats in results:
+        latency = stats.get('latency_ms', {})
+        print(f"{stats['offered_rate']:6.1f} | {stats['throughput']:6.1f} | {stats['backlog']:7d} | "
+              f"{latency.get('mean', 0):8.1f} | {latency.get('p50', 0):8.1f} | {latency.get('p99', 0):8.1f} | "
+              f"{latency.get('p99.9', 0):8.1f} | " +
+              " | ".join(f"{resource['utilization']:8.1f}" for resource in stats['resources'].values()))
+
+    print(f"\nQueueing at {results[-1]['offered_rate']:.1f}/s:")
+    for name, resource in results[-1]['resources'].items():
+        print(f"  {name:8s} wait mean {resource['wait_mean_ms']:8.1f} ms, p99 {resource['wait_p99_ms']:8.1f} ms, "
+              f"{resource['queued']} still queued")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of distcc or inference traffic")
+    parser.add_argument('workload', choices=['distcc', 'inference'])
+    parser.add_argument('--rate', default='4', help="offered jobs per second; a comma list sweeps the load "
+                                                    "(e.g. 2,4,6,8)")
+    parser.add_argument('--duration', type=float, default=600.0, help="simulated seconds measured")
+    parser.add_argument('--warmup', type=float, default=60.0, help="simulated seconds discarded first")
+    parser.add_argument('--switch-gbps', type=float, default=2.5)
+    parser.add_argument('--nic-gbps', type=float, default=2.5)
+    parser.add_argument('--cv', type=float, help="coefficient of variation of compile / NPU time "
+                                                 "(default 0.5 distcc, 0.3 inference)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print the statistics as JSON")
+
+    distcc = parser.add_argument_group('distcc')
+    distcc.add_argument('--nodes', type=int, default=8)
+    distcc.add_argument('--slots', type=int, default=1, help="concurrent compiles per node")
+    distcc.add_argument('--compile-seconds', type=float, default=1.0, help="mean compile time per job")
+    distcc.add_argument('--san-gbps', type=float, default=10.0)
+    distcc.add_argument('--no-san', action='store_true', help="sources and objects travel only over the switch")
+
+    inference = parser.add_argument_group('inference')
+    inference.add_argument('--boards', type=int, default=3)
+    inference.add_argument('--cores', type=int, default=3, help="NPU cores per board")
+    inference.add_argument('--npu-ms', type=float, default=20.0, help="mean NPU time per request")
+    inference.add_argument('--input-kb', type=float, default=150.0)
+    inference.add_argument('--output-kb', type=float, default=4.0)
+    args = parser.parse_args()
+
+    try:
+        rates = [float(rate) for rate in args.rate.split(',')]
+    except ValueError:
+        parser.error(f"--rate: expected numbers, got '{args.rate}'")
+
+    results = []
+    for rate in rates:
+        if args.workload == 'distcc':
+            workload = DistccWorkload(rate, nodes=args.nodes, slots=args.slots,
+                                      compile_seconds=args.compile_seconds,
+                                      cv=0.5 if args.cv is None else args.cv,
+                                      switch_gbps=args.switch_gbps, nic_gbps=args.nic_gbps,
+                                      san_gbps=args.san_gbps, san=not args.no_san, seed=args.seed)
+        else:
+            workload = InferenceWorkload(rate, boards=args.boards, cores=args.cores, npu_ms=args.npu_ms,
+                                         cv=0.3 if args.cv is None else args.cv, input_kb=args.input_kb,
+                                         output_kb=args.output_kb, switch_gbps=args.switch_gbps,
+                                         nic_gbps=args.nic_gbps, seed=args.seed)
+        results.append(workload.run(args.duration, args.warmup))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()